@@ -0,0 +1,69 @@
+'''Batch color quantization of many images (and numbers of clusters) over a pool of processes'''
+
+import matplotlib
+matplotlib.use('Agg') # plots are only ever saved to files
+
+import os
+import glob
+import argparse
+
+from time import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from k_means import MODES, load_palette, quantize_file
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+def list_images(inputs):
+    # expands directories and glob patterns into the image files they match
+    fnames = []
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*')
+        fnames.extend(fname for fname in sorted(glob.glob(pattern))
+                      if os.path.isfile(fname) and os.path.splitext(fname)[1].lower() in IMAGE_EXTS)
+    return list(dict.fromkeys(fnames)) # drops duplicates (e.g. matched by both a directory and a pattern)
+
+def main():
+    args = get_parser().parse_args()
+    fnames = list_images(args.inputs)
+    if len(fnames) == 0:
+        print("No images found")
+        return
+    os.makedirs(args.save_path, exist_ok=True)
+
+    n_clusters, palette_kwargs = args.n_clusters, {}
+    if args.palette:
+        # every image starts from (or only uses) the same colors, so the palette is loaded (and its lookup table built) once
+        palette = load_palette(args.palette, args.lut_bits)
+        n_clusters, palette_kwargs = [len(palette)], {'palette': palette, 'fixed_palette': args.fixed_palette}
+
+    # each task is a whole image, so that it's decoded only once and reused for every number of clusters
+    quantize = partial(quantize_file, n_clusters_list=n_clusters, save_path=args.save_path,
+                       mode=args.mode, plot=args.plot, **palette_kwargs)
+    start_time = time()
+    with ProcessPoolExecutor(args.processes) as executor:
+        futures = {executor.submit(quantize, fname): fname for fname in fnames}
+        for future in as_completed(futures):
+            try:
+                print(f"Image saved to {', '.join(future.result())}")
+            except Exception as e:
+                print(f"Failed to quantize {futures[future]}: {e}")
+
+    print(f"Δt = {(time() - start_time):.2f}s")
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Color quantization of a batch of images with k-means")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("--n_clusters", "-k", nargs="+", type=int, default=[128], help="Numbers of colors (one output per value)")
+    parser.add_argument("--save_path", "-o", default="o", help="Directory where the results are saved")
+    parser.add_argument("--mode", choices=MODES, default="sample", help="How the cluster centers are fit (see k_means.fit_centers)")
+    parser.add_argument("--processes", "-j", type=int, default=None, help="Number of processes (defaults to the CPU count)")
+    parser.add_argument("--plot", action="store_true", help="Also save the RGB space and histogram plots")
+    parser.add_argument("--palette", help="Palette .npy file (see k_means --save_palette) shared by every image")
+    parser.add_argument("--fixed_palette", action="store_true", help="Use the --palette colors as is, without fitting")
+    parser.add_argument("--lut_bits", type=int, default=None, help="Bits per channel of the --palette lookup table")
+    return parser
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+'''Fast k-means diagnostics (palette bars and RGB space plots) that scale to large images and big batches'''
+
+import numpy as np
+import matplotlib.image as img
+import matplotlib.pyplot as plt
+
+MAX_POINTS = 20_000 # points drawn in a 3D scatter plot (matplotlib gets very slow beyond a few tens of thousands)
+
+def cluster_frequencies(labels, n_clusters):
+    # returns the fraction of pixels in each cluster
+    counts = np.bincount(np.ravel(labels), minlength=n_clusters)
+    return counts / max(counts.sum(), 1)
+
+def palette_bar(colors, frequencies, width=500, height=50, sort=True):
+    '''
+    Returns a (height, width, 3) uint8 image with a bar for each color (RGB values in the [0, 255] range),
+    as wide as its frequency, from the most to the least frequent one if sort is True
+    '''
+    colors = np.asarray(colors, dtype=np.float64)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    if sort:
+        order = np.argsort(-frequencies, kind='stable')
+        colors, frequencies = colors[order], frequencies[order]
+    edges = np.cumsum(frequencies) / frequencies.sum() * width
+    columns = np.searchsorted(edges, np.arange(width) + 0.5) # the color whose bar covers each column's center
+    row = np.rint(colors[np.minimum(columns, len(colors) - 1)]).clip(0, 255).astype(np.uint8)
+    return np.broadcast_to(row, (height, width, 3)).copy()
+
+def color_points(image, labels=None, max_points=MAX_POINTS, random_state=None):
+    '''
+    Returns the distinct colors of the image (as (n, 3) uint8), how many pixels have each one and, if given,
+    their labels (every pixel of the same color is in the same cluster, as it's assigned to the nearest center)
+    Note: if there are more than max_points distinct colors, a random subset of them is returned,
+          drawn in proportion to their pixel counts
+    '''
+    pixels = np.asarray(image).reshape(-1, 3)
+    if not np.issubdtype(pixels.dtype, np.integer):
+        pixels = np.rint(pixels).clip(0, 255).astype(np.uint8) # e.g. a quantized image scaled back to [0, 255]
+    codes = (pixels[:, 0].astype(np.uint32) << 16) | (pixels[:, 1].astype(np.uint32) << 8) | pixels[:, 2]
+    codes, first, counts = np.unique(codes, return_index=True, return_counts=True)
+    if max_points is not None and len(codes) > max_points:
+        rng = np.random.default_rng(random_state)
+        keep = np.sort(rng.choice(len(codes), max_points, replace=False, p=counts / counts.sum()))
+        codes, first, counts = codes[keep], first[keep], counts[keep]
+    points = np.stack([codes >> 16, (codes >> 8) & 0xFF, codes & 0xFF], axis=1).astype(np.uint8)
+    return points, counts, (None if labels is None else np.ravel(labels)[first])
+
+def point_sizes(counts, min_size=1, max_size=60):
+    # marker areas growing with the square root of each point's pixel count
+    scale = np.sqrt(counts / counts.max())
+    return min_size + (max_size - min_size) * scale
+
+def plot_points(points, colors, counts=None, show=True, save_fname=None):
+    '''
+    Plots the (n, 3) points into the 3D space defined by (x, y, z) = (R, G, B), colored by colors (in the [0, 1] range)
+    and sized by their pixel counts, if given
+    '''
+    fig = plt.figure()
+    ax = fig.add_subplot(projection='3d')
+    ax.scatter(points[:, 0], points[:, 1], points[:, 2], c=colors,
+               s=None if counts is None else point_sizes(counts), depthshade=False)
+
+    if save_fname: plt.savefig(save_fname, bbox_inches='tight')
+    if show: plt.show()
+    else: plt.close(fig)
+
+def plot_palette(bar, show=True, save_fname=None):
+    '''
+    Saves the palette_bar image as is (no figure needed) and/or shows it
+    '''
+    if save_fname: img.imsave(save_fname, bar)
+    if show:
+        plt.figure()
+        plt.axis("off")
+        plt.imshow(bar)
+        plt.show()
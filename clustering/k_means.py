@@ -4,19 +4,20 @@ import cv2
 import functools
 import numpy as np
 import matplotlib.image as img
-import matplotlib.pyplot as plt
+
+import argparse
 
 from os import path
-from sys import argv
 from time import time
-from sklearn.cluster import KMeans
-from mpl_toolkits.mplot3d import Axes3D
+from scipy.spatial import cKDTree
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from diagnostics import MAX_POINTS, cluster_frequencies, color_points, palette_bar, plot_palette, plot_points
 
 def duration(func):
     @functools.wraps(func)
-    def wrapper(*args):
+    def wrapper(*args, **kwargs):
         start = time()
-        result = func(*args)
+        result = func(*args, **kwargs)
         end = time()
         print(f'({func.__name__}) Δt: {end-start:.4f} seconds')
         return result
@@ -30,99 +31,246 @@ def normalize(image):
     '''
     return (image / 255).reshape(-1, 3)
 
+MODES = ('full', 'minibatch', 'sample', 'histogram')
+
+def sample_pixels(pixels, sample_size, rng):
+    '''
+    Returns (at most) sample_size random rows of the (n, 3) uint8 pixels, normalized to [0, 1] as float32
+    '''
+    if len(pixels) > sample_size:
+        pixels = pixels[rng.integers(0, len(pixels), sample_size)]
+    return pixels.astype(np.float32) / 255
+
+def color_histogram(pixels, chunk_size=1 << 22):
+    '''
+    Returns the distinct colors of the (n, 3) uint8 pixels (normalized to [0, 1] as float32) and how many pixels have each one
+    Note: colors are counted by their 24-bit RGB code, a chunk of pixels at a time
+    '''
+    counts = np.zeros(1 << 24, dtype=np.int64)
+    for start in range(0, len(pixels), chunk_size):
+        chunk = pixels[start:start + chunk_size].astype(np.uint32)
+        counts += np.bincount((chunk[:, 0] << 16) | (chunk[:, 1] << 8) | chunk[:, 2], minlength=1 << 24)
+    codes = np.flatnonzero(counts)
+    colors = np.stack([codes >> 16, (codes >> 8) & 0xFF, codes & 0xFF], axis=1).astype(np.float32) / 255
+    return colors, counts[codes]
+
+def rgb_codes(pixels, bits=8):
+    # packs the (n, 3) uint8 pixels into integer codes, keeping only the highest bits of each channel
+    pixels = pixels.astype(np.uint32) >> (8 - bits)
+    return (pixels[:, 0] << (2 * bits)) | (pixels[:, 1] << bits) | pixels[:, 2]
+
+class Palette:
+    '''
+    Fixed set of colors (in the [0, 1] range) with a fast nearest color lookup for uint8 pixels, either:
+        - a KD-tree over the colors, queried once for each distinct color of a chunk of pixels
+        - a lookup table from every RGB code with lut_bits bits per channel to its nearest color, built once,
+          so that assigning a pixel is a single array lookup (exact for lut_bits=8, with a 16 MB table,
+          while lut_bits=6 only needs 256 KB and rarely picks a different color)
+    '''
+    def __init__(self, colors, lut_bits=None):
+        self.colors = np.asarray(colors, dtype=np.float32).reshape(-1, 3)
+        self.tree = cKDTree(self.colors * 255)
+        self.label_dtype = np.uint8 if len(self.colors) <= 256 else np.int32
+        self.lut_bits = lut_bits
+        self.lut = None
+        if lut_bits is not None:
+            self.build_lut(lut_bits)
+
+    def __len__(self):
+        return len(self.colors)
+
+    def build_lut(self, bits):
+        levels = 1 << bits
+        step = 256 / levels
+        values = (np.arange(levels) + 0.5) * step - 0.5 # center of each channel's bin
+        grid = np.stack(np.meshgrid(values, values, values, indexing='ij'), axis=-1).reshape(-1, 3)
+        self.lut = self.tree.query(grid)[1].astype(self.label_dtype)
+        self.lut_bits = bits
+
+    def assign(self, pixels, chunk_size=1 << 20):
+        '''
+        Returns the index of the nearest color to each of the (n, 3) uint8 pixels, a chunk of pixels at a time
+        '''
+        labels = np.empty(len(pixels), dtype=self.label_dtype)
+        for start in range(0, len(pixels), chunk_size):
+            chunk = pixels[start:start + chunk_size]
+            if self.lut is not None:
+                labels[start:start + chunk_size] = self.lut[rgb_codes(chunk, self.lut_bits)]
+            else:
+                codes, inverse = np.unique(rgb_codes(chunk), return_inverse=True)
+                colors = np.stack([codes >> 16, (codes >> 8) & 0xFF, codes & 0xFF], axis=1)
+                labels[start:start + chunk_size] = self.tree.query(colors)[1][inverse.ravel()]
+        return labels
+
+    def quantize(self, image):
+        '''
+        Returns the image with each pixel replaced by its nearest palette color (in the [0, 1] range) and the labels
+        '''
+        labels = self.assign(image.reshape(-1, 3))
+        return self.colors[labels].reshape(image.shape), labels
+
+def assign(pixels, centers, chunk_size=1 << 20):
+    # returns the index of the nearest center to each of the (n, 3) uint8 pixels (with centers in the [0, 1] range)
+    return Palette(centers).assign(pixels, chunk_size)
+
+def fit_centers(pixels, n_clusters, n_init=10, max_iter=300, mode='sample',
+                sample_size=100_000, batch_size=4096, random_state=None, init=None):
+    '''
+    Fits the cluster centers (in the [0, 1] range) without running k-means on every pixel:
+        'sample'    : fits on a random subsample of sample_size pixels
+        'minibatch' : fits on a stream of max_iter random mini-batches of batch_size pixels
+        'histogram' : fits on the image's distinct colors, weighted by their pixel counts
+                      (exact, but only faster than 'sample' for images with few distinct colors)
+    Note: init can be a (n_clusters, 3) array of colors to warm-start from (instead of n_init random starts)
+    '''
+    rng = np.random.default_rng(random_state)
+    k_means_kwargs = {'init': init, 'n_init': 1} if init is not None else {'n_init': n_init}
+    if mode == 'sample':
+        k_colors = KMeans(n_clusters, max_iter=max_iter, random_state=random_state, **k_means_kwargs)
+        return k_colors.fit(sample_pixels(pixels, sample_size, rng)).cluster_centers_
+    elif mode == 'minibatch':
+        k_colors = MiniBatchKMeans(n_clusters, batch_size=batch_size, random_state=random_state, **k_means_kwargs)
+        for _ in range(max_iter):
+            k_colors.partial_fit(sample_pixels(pixels, max(batch_size, n_clusters), rng))
+        return k_colors.cluster_centers_
+    elif mode == 'histogram':
+        colors, counts = color_histogram(pixels)
+        if len(colors) <= n_clusters:
+            return colors # every distinct color gets its own cluster
+        k_colors = KMeans(n_clusters, max_iter=max_iter, random_state=random_state, **k_means_kwargs)
+        return k_colors.fit(colors, sample_weight=counts).cluster_centers_
+    raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+
 @duration
-def cluster(image, n_clusters, n_init=10, max_iter=300):
+def cluster(image, n_clusters, n_init=10, max_iter=300, mode='full', palette=None, fixed_palette=False, **fit_kwargs):
     '''
     Groups the image's pixels into clusters by their color similarity and 
     then creates an image representation using only the n_clusters colors
+    Note: mode='full' runs k-means on every pixel, while the other modes (see fit_centers) fit on
+          fewer points and then assign every pixel to its nearest center (see Palette), by chunks
+    Note: an existing palette (a Palette or an (n_clusters, 3) array in the [0, 1] range, e.g. the previous
+          video frame's cluster centers) is used to warm-start k-means, or as is if fixed_palette is True
     '''
-    normalized = normalize(image)
-    k_colors = KMeans(n_clusters, n_init=n_init, max_iter=max_iter).fit(normalized)
-    compressed = k_colors.cluster_centers_[k_colors.labels_]
-    compressed = np.reshape(compressed, (image.shape))
-    return compressed, k_colors.labels_, k_colors.cluster_centers_
+    if palette is not None:
+        n_clusters = len(palette)
+        if fixed_palette:
+            palette = palette if isinstance(palette, Palette) else Palette(palette)
+            compressed, labels = palette.quantize(image)
+            return compressed, labels, palette.colors.copy()
+        palette = palette.colors if isinstance(palette, Palette) else np.asarray(palette, dtype=np.float32)
 
-def plot_3d(image, show=True, save_fname=None, use_rgb_colors=True):
+    if mode == 'full':
+        normalized = normalize(image)
+        k_means_kwargs = {'init': palette.astype(normalized.dtype), 'n_init': 1} if palette is not None else {'n_init': n_init}
+        k_colors = KMeans(n_clusters, max_iter=max_iter, **k_means_kwargs).fit(normalized)
+        compressed = k_colors.cluster_centers_[k_colors.labels_]
+        compressed = np.reshape(compressed, (image.shape))
+        return compressed, k_colors.labels_, k_colors.cluster_centers_
+
+    pixels = image.reshape(-1, 3)
+    cluster_centers = fit_centers(pixels, n_clusters, n_init, max_iter, mode, init=palette, **fit_kwargs).astype(np.float32)
+    labels = assign(pixels, cluster_centers)
+    compressed = cluster_centers[labels].reshape(image.shape)
+    return compressed, labels, cluster_centers
+
+def plot_3d(image, show=True, save_fname=None, use_rgb_colors=True, max_points=MAX_POINTS):
     '''
     Plots the image's pixels into the 3D space defined by (x, y, z) = (R, G, B)
+    Note: each distinct color is drawn once, sized by its pixel count (see diagnostics.color_points)
     '''
-    r = image[:, :, 0].flatten()
-    g = image[:, :, 1].flatten()
-    b = image[:, :, 2].flatten()
+    points, counts, _ = color_points(image, max_points=max_points)
+    plot_points(points, None if not use_rgb_colors
+                else points / 255, counts, show, save_fname) # colors each point with it's RGB color value
 
-    fig = plt.figure()
-    ax = Axes3D(fig)
-    ax.scatter(r, g, b, c=None if not use_rgb_colors
-               else image.reshape(-1, 3) / 255) # colors each point with it's RGB color value
+def plot_clusters(image, labels, colors, show=True, save_fname=None, max_points=MAX_POINTS):
+    '''
+    Plots the original image's pixels with their cluster colors
+    '''
+    points, counts, labels = color_points(image, labels, max_points)
+    plot_points(points, np.asarray(colors)[labels] / 255, counts, show, save_fname)
 
-    if save_fname: plt.savefig(save_fname, bbox_inches='tight')
-    if show: plt.show()
+def plot_histogram(n_clusters, colors, labels, show=True, save_fname=None):
+    '''
+    Plots the cluster colors (in the [0, 255] range) as a bar, ordered by decreasing frequency
+    '''
+    plot_palette(palette_bar(colors, cluster_frequencies(labels, n_clusters)), show, save_fname)
 
-def plot_clusters(image, labels, colors, show=True, save_fname=None):
+def plot_all(image, k_image, labels, cluster_centers, show=True, save_prefix=None):
     '''
-    Plots the original image's pixels with their cluster colors
+    Plots the quantized pixels in RGB space, the original pixels with their cluster colors and the colors' histogram
+    (with k_image and cluster_centers in the [0, 255] range), saving them as save_prefix + "_*.png" if given
     '''
-    r = image[:, :, 0].flatten()
-    g = image[:, :, 1].flatten()
-    b = image[:, :, 2].flatten()
+    n_clusters = len(cluster_centers)
+    save_fname = lambda suffix: f"{save_prefix}{suffix}.png" if save_prefix else None
+    plot_3d(k_image, show, save_fname("_plot"))
+    plot_clusters(image, labels, colors=cluster_centers, show=show, save_fname=save_fname("_clusters"))
+    plot_histogram(n_clusters, colors=cluster_centers, labels=labels, show=show, save_fname=save_fname("_histogram"))
 
-    fig = plt.figure()
-    ax = Axes3D(fig)
-    ax.scatter(r, g, b, c=colors[labels] / 255)
+def read_image(image_fname):
+    image = cv2.imread(image_fname)
+    if image is None:
+        raise ValueError(f"Couldn't read image '{image_fname}'")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
-    if save_fname: plt.savefig(save_fname, bbox_inches='tight')
-    if show: plt.show()
+def load_palette(fname, lut_bits=None):
+    # reads an (n_colors, 3) palette saved with --save_palette (RGB values in the [0, 1] range)
+    return Palette(np.load(fname), lut_bits)
 
-def plot_histogram(n_clusters, colors, show=True, save_fname=None):
+def quantize_file(image_fname, n_clusters_list, save_path="", mode='full', plot=False, **cluster_kwargs):
+    '''
+    Decodes the image once and saves its quantization with each number of clusters in n_clusters_list
+    (as save_path/{image_name}{n_clusters}{image_ext}), optionally saving the plots alongside it
+    Returns the saved image file names
     '''
-    Plots the original image's pixels with their cluster colors
-    Note: the RGB values must be mapped from [0, 255] to [0, 1]
-    '''
-    hist, _ = np.histogram(labels, bins=n_clusters)
-    hist = hist.astype("float") / hist.sum()
-    
-    # order by decreasing color frequency
-    colors = colors[(-hist).argsort()]
-    hist = hist[(-hist).argsort()]
-    
-    chart = np.zeros((50, 500, 3), dtype=np.uint8)
-
-    start = 0
-    for i in range(n_clusters):
-        end = start + hist[i] * 500
-        r, g, b = colors[i][0:3]
-        cv2.rectangle(img=chart, pt1=(int(start), 0), pt2=(int(end), 50), color=(r, g, b), thickness=-1)
-        start = end	
-    
-    plt.figure()
-    plt.axis("off")
-    plt.imshow(chart)
-    if save_fname: plt.savefig(save_fname, bbox_inches='tight')
-    if show: plt.show()
-
-try:
-    image_fname = argv[1]
     image_name, image_ext = path.splitext(path.split(image_fname)[-1])
-    n_clusters = int(argv[2]) if len(argv) > 2 else 128
-    save_path = argv[3] if len(argv) > 3 else ""
-except:
-    print('\nusage: k_means.py image_fname [n_clusters] [save_path]')
-    exit()
+    image = read_image(image_fname)
+
+    if plot:
+        plot_3d(image, show=False, save_fname=path.join(save_path, f"{image_name}_plot.png"))
+
+    fnames = []
+    for n_clusters in n_clusters_list:
+        k_image, labels, cluster_centers = cluster(image, n_clusters, mode=mode, **cluster_kwargs)
+        fname = path.join(save_path, f"{image_name}{n_clusters}{image_ext}")
+        img.imsave(fname, k_image)
+        fnames.append(fname)
 
-image = cv2.cvtColor(cv2.imread(image_fname), cv2.COLOR_BGR2RGB)
-k_image, labels, cluster_centers = cluster(image, n_clusters) # k colors with RGB values normalized to [0, 1] range
+        if plot:
+            plot_all(image, k_image * 255, labels, cluster_centers * 255, show=False,
+                     save_prefix=path.join(save_path, f"{image_name}{n_clusters}"))
+    return fnames
 
-fname = path.join(save_path, f"{image_name}{n_clusters}{image_ext}")
-img.imsave(fname, k_image)
-print(f"Image saved to {fname}")
+def main():
+    args = get_parser().parse_args()
+    image = read_image(args.image_fname)
+    image_name, image_ext = path.splitext(path.split(args.image_fname)[-1])
+    palette = load_palette(args.palette, args.lut_bits) if args.palette else None
+    k_image, labels, cluster_centers = cluster(image, args.n_clusters, mode=args.mode, palette=palette,
+                                               fixed_palette=args.fixed_palette) # k colors with RGB values normalized to [0, 1] range
 
-# denormalizes values
-k_image *= 255
-cluster_centers *= 255
+    fname = path.join(args.save_path, f"{image_name}{len(cluster_centers)}{image_ext}")
+    img.imsave(fname, k_image)
+    print(f"Image saved to {fname}")
+    if args.save_palette:
+        np.save(args.save_palette, np.asarray(cluster_centers, dtype=np.float32))
+        print(f"Palette saved to {args.save_palette}")
 
-plot_3d(image)
-plot_3d(k_image)
+    if not args.no_plot:
+        plot_3d(image)
+        plot_all(image, k_image * 255, labels, cluster_centers * 255) # denormalizes values
 
-plot_clusters(image, labels, colors=cluster_centers)
+def get_parser():
+    parser = argparse.ArgumentParser(description="Image color quantization with k-means")
+    parser.add_argument("image_fname", help="Image to quantize")
+    parser.add_argument("n_clusters", nargs="?", type=int, default=128, help="Number of colors")
+    parser.add_argument("save_path", nargs="?", default="", help="Directory where the result is saved")
+    parser.add_argument("--mode", choices=MODES, default="full", help="How the cluster centers are fit (see fit_centers)")
+    parser.add_argument("--no_plot", action="store_true", help="Don't show the RGB space and histogram plots")
+    parser.add_argument("--palette", help="Palette .npy file (from --save_palette) to warm-start from, e.g. the previous frame's")
+    parser.add_argument("--fixed_palette", action="store_true", help="Use the --palette colors as is, without fitting")
+    parser.add_argument("--lut_bits", type=int, default=None, help="Bits per channel of the --palette lookup table (see Palette)")
+    parser.add_argument("--save_palette", help="Saves the cluster centers to this .npy file")
+    return parser
 
-plot_histogram(n_clusters, colors=cluster_centers)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
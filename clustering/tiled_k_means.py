@@ -0,0 +1,170 @@
+'''Color quantization of images too large to fit in memory, reading and writing them a strip of rows at a time'''
+
+import os
+import cv2
+import argparse
+import numpy as np
+
+from k_means import Palette, duration, fit_centers, load_palette
+
+STRIP_PIXELS = 1 << 22 # pixels read (and assigned) at a time, i.e. ~12 MB of uint8 RGB
+
+def read_ppm_header(f):
+    # returns the (width, height, maxval) of a binary PPM (P6) file and leaves f at the start of its pixels
+    fields = []
+    while len(fields) < 4:
+        line = f.readline()
+        if not line:
+            raise ValueError("Truncated PPM header")
+        fields.extend(line.split(b'#')[0].split())
+    if fields[0] != b'P6' or len(fields) != 4:
+        raise ValueError("Only binary PPM (P6) files are supported")
+    return int(fields[1]), int(fields[2]), int(fields[3])
+
+def open_image(fname):
+    '''
+    Returns a read-only (height, width, 3) uint8 RGB array of the image, memory-mapped for .npy and
+    binary .ppm files (so only the strips being processed are ever loaded), or decoded whole by OpenCV otherwise
+    '''
+    ext = os.path.splitext(fname)[1].lower()
+    if ext == '.npy':
+        image = np.load(fname, mmap_mode='r')
+    elif ext == '.ppm':
+        with open(fname, 'rb') as f:
+            width, height, maxval = read_ppm_header(f)
+            offset = f.tell()
+        if maxval != 255:
+            raise ValueError(f"Only 8-bit PPM files are supported (maxval is {maxval})")
+        image = np.memmap(fname, dtype=np.uint8, mode='r', offset=offset, shape=(height, width, 3))
+    else:
+        image = cv2.imread(fname) # Note: this isn't memory-bounded, convert big images to .ppm or .npy first
+        if image is None:
+            raise ValueError(f"Couldn't read image '{fname}'")
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if image.ndim != 3 or image.shape[2] != 3 or image.dtype != np.uint8:
+        raise ValueError(f"Expected a (height, width, 3) uint8 image, got {image.shape} {image.dtype}")
+    return image
+
+def create_image(fname, height, width, channels=3):
+    '''
+    Returns a writable (height, width, channels) uint8 memory-mapped .npy or binary .ppm (or .pgm, for channels=1) file
+    '''
+    ext = os.path.splitext(fname)[1].lower()
+    shape = (height, width, channels) if channels != 1 else (height, width)
+    if ext == '.npy':
+        return np.lib.format.open_memmap(fname, mode='w+', dtype=np.uint8, shape=shape)
+    if ext in ('.ppm', '.pgm'):
+        if (ext == '.ppm') != (channels == 3):
+            raise ValueError(f"'{ext}' files can't have {channels} channel(s)")
+        header = f"{'P6' if channels == 3 else 'P5'}\n{width} {height}\n255\n".encode('ascii')
+        with open(fname, 'wb') as f:
+            f.write(header)
+            f.truncate(len(header) + height * width * channels)
+        return np.memmap(fname, dtype=np.uint8, mode='r+', offset=len(header), shape=shape)
+    raise ValueError(f"Can't stream to '{ext}' files, expected .npy, .ppm or .pgm")
+
+def strips(height, strip_height):
+    # yields the row slices of consecutive strips of (at most) strip_height rows
+    for top in range(0, height, strip_height):
+        yield slice(top, min(top + strip_height, height))
+
+def sample_image(image, sample_size, strip_height, rng):
+    '''
+    Returns about sample_size uniformly random pixels of the image (as (n, 3) uint8), drawing from each strip
+    in proportion to its number of rows, so that only one strip is ever loaded
+    '''
+    height, width = image.shape[:2]
+    samples = []
+    for rows in strips(height, strip_height):
+        n_rows = rows.stop - rows.start
+        n = rng.binomial(sample_size, n_rows / height)
+        if n == 0:
+            continue
+        indices = rng.integers(0, n_rows * width, n)
+        samples.append(np.asarray(image[rows]).reshape(-1, 3)[indices])
+    return np.concatenate(samples) if len(samples) != 0 else np.zeros((0, 3), dtype=np.uint8)
+
+@duration
+def quantize_tiled(image, n_clusters, output, labels_output=None, sample_size=1_000_000, strip_height=None,
+                   n_init=3, max_iter=300, palette=None, fixed_palette=False, lut_bits=None, random_state=None):
+    '''
+    Quantizes the (height, width, 3) uint8 image (e.g. from open_image) into n_clusters colors, writing the result to
+    the output uint8 array (e.g. from create_image) and, optionally, each pixel's cluster index to labels_output
+    Peak memory is bounded by the sample and a strip of strip_height rows (defaults to ~STRIP_PIXELS pixels),
+    regardless of the image size: the colors are fit on a sample gathered strip by strip (see sample_image),
+    and then the pixels are assigned to their nearest color (see Palette) one strip at a time
+    Returns the (n_clusters, 3) palette colors in the [0, 1] range
+    '''
+    height, width = image.shape[:2]
+    strip_height = strip_height or max(1, STRIP_PIXELS // width)
+
+    if palette is not None and fixed_palette:
+        palette = palette if isinstance(palette, Palette) else Palette(palette, lut_bits)
+    else:
+        init = None
+        if palette is not None:
+            init = palette.colors if isinstance(palette, Palette) else np.asarray(palette, dtype=np.float32)
+            n_clusters = len(init)
+        rng = np.random.default_rng(random_state)
+        sample = sample_image(image, sample_size, strip_height, rng)
+        colors = fit_centers(sample, n_clusters, n_init, max_iter, mode='sample', sample_size=len(sample),
+                             random_state=random_state, init=init)
+        palette = Palette(colors, lut_bits)
+
+    if labels_output is not None and len(palette) > np.iinfo(labels_output.dtype).max + 1:
+        raise ValueError(f"Can't store {len(palette)} labels as {labels_output.dtype}")
+
+    colors = np.rint(palette.colors * 255).astype(np.uint8) # so that no float copy of a strip is ever made
+    for rows in strips(height, strip_height):
+        labels = palette.assign(np.asarray(image[rows]).reshape(-1, 3))
+        output[rows] = colors[labels].reshape(-1, width, 3)
+        if labels_output is not None:
+            labels_output[rows] = labels.reshape(-1, width)
+
+    for array in (output, labels_output):
+        if isinstance(array, np.memmap):
+            array.flush()
+    return palette.colors
+
+def quantize_file(image_fname, output_fname, n_clusters, labels_fname=None, **kwargs):
+    '''
+    Quantizes the image file into output_fname (.npy or .ppm) and, optionally, saves the labels to labels_fname (.npy or .pgm)
+    Returns the palette colors in the [0, 1] range
+    '''
+    image = open_image(image_fname)
+    height, width = image.shape[:2]
+    output = create_image(output_fname, height, width)
+    labels_output = create_image(labels_fname, height, width, channels=1) if labels_fname else None
+    return quantize_tiled(image, n_clusters, output, labels_output, **kwargs)
+
+def main():
+    args = get_parser().parse_args()
+    palette = load_palette(args.palette, args.lut_bits) if args.palette else None
+
+    colors = quantize_file(args.image_fname, args.output_fname, args.n_clusters, args.labels,
+                           sample_size=args.sample_size, strip_height=args.strip_height, n_init=args.n_init,
+                           palette=palette, fixed_palette=args.fixed_palette, lut_bits=args.lut_bits,
+                           random_state=args.random_state)
+    print(f"Image saved to {args.output_fname}")
+    if args.save_palette:
+        np.save(args.save_palette, colors)
+        print(f"Palette saved to {args.save_palette}")
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Memory-bounded color quantization of very large images with k-means")
+    parser.add_argument("image_fname", help="Image to quantize (.npy or binary .ppm are memory-mapped, other formats are decoded whole)")
+    parser.add_argument("output_fname", help="Quantized image (.npy or .ppm), written a strip at a time")
+    parser.add_argument("n_clusters", nargs="?", type=int, default=128, help="Number of colors")
+    parser.add_argument("--labels", help="Also saves each pixel's cluster index to this .npy or .pgm file")
+    parser.add_argument("--sample_size", type=int, default=1_000_000, help="Number of pixels the colors are fit on")
+    parser.add_argument("--strip_height", type=int, default=None, help="Rows read at a time (defaults to ~4M pixels per strip)")
+    parser.add_argument("--n_init", type=int, default=3, help="Number of k-means runs on the sample")
+    parser.add_argument("--random_state", type=int, default=None, help="Random seed (for reproducible results)")
+    parser.add_argument("--palette", help="Palette .npy file (see k_means --save_palette) to warm-start from")
+    parser.add_argument("--fixed_palette", action="store_true", help="Use the --palette colors as is, without fitting")
+    parser.add_argument("--lut_bits", type=int, default=None, help="Bits per channel of the palette's lookup table (see Palette)")
+    parser.add_argument("--save_palette", help="Saves the palette colors to this .npy file")
+    return parser
+
+if __name__ == "__main__":
+    main()
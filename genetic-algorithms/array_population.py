@@ -0,0 +1,117 @@
+'''Vectorized version of to_be_or_not_to_be's Population, storing every individual's genes in a single NumPy array'''
+
+import numpy as np
+
+from time import time
+from problem import PhraseProblem
+from selection import get_selection
+from to_be_or_not_to_be import Population
+
+# ______________________________________________________________________________
+class ArrayPopulation:
+    ''' Same API as Population, but each generation is a handful of array operations over a
+        (population_size, length) uint8 array of character codes, instead of a Python loop per gene
+        Note: target is ignored if a problem (see problem.py) is given '''
+    def __init__(self, target, population_size, mutation_rate, seed=None, selection=None, problem=None):
+        self.problem = problem if problem is not None else PhraseProblem(target)
+        self.target = target
+        self.mutation_rate = mutation_rate
+        self.population_size = population_size
+        self.rng = np.random.default_rng(seed)
+        self.char_codes = self.problem.alphabet.codes
+        self.genes = self.random_genes(population_size)
+
+        self.selection = get_selection(selection) # defaults to roulette wheel selection (see selection.py)
+        self.parents = None # (2, population_size) indices of each child's parents
+        self.generation = 0
+        self.best = ""
+        self.perfect_score = self.problem.perfect_score
+
+        self.finished = False
+        self.calculate_fitness()
+
+    def random_genes(self, n):
+        return self.problem.alphabet.random((n, self.problem.length), self.rng)
+
+    def calculate_fitness(self):
+        self.fitness = self.problem.evaluate(self.genes)
+
+    # returns a copy of the genes of the n fittest individuals
+    def get_elite(self, n):
+        n = min(n, self.population_size)
+        return self.genes[np.argpartition(-self.fitness, n - 1)[:n]].copy()
+
+    # replaces the least fit individuals with the given genes (e.g. migrants from another population)
+    def replace_worst(self, genes):
+        n = min(len(genes), self.population_size)
+        worst = np.argpartition(self.fitness, n - 1)[:n]
+        self.genes[worst] = genes[:n]
+        self.fitness[worst] = self.problem.evaluate(self.genes[worst])
+
+    # picks the parents of the next generation
+    def natural_selection(self):
+        self.parents = self.selection(self.fitness, self.population_size, self.rng)
+
+    # creates a new generation
+    def generate(self):
+        length = self.genes.shape[1]
+        partners = self.parents
+
+        # each child gets its first parent's genes before a random "midpoint" and its second parent's after it
+        midpoints = self.rng.integers(0, length, self.population_size)
+        from_first = np.arange(length) < midpoints[:, None]
+        children = np.where(from_first, self.genes[partners[0]], self.genes[partners[1]])
+
+        mutated = self.rng.random(children.shape) < self.mutation_rate
+        children[mutated] = self.char_codes[self.rng.integers(0, len(self.char_codes), np.count_nonzero(mutated))]
+        self.genes = children
+
+        self.generation += 1
+
+    # compute the current "most fit" member of the population
+    def evaluate(self):
+        best_fit_individual_index = int(self.fitness.argmax())
+        self.best = self.get_phrase(best_fit_individual_index)
+        if self.fitness[best_fit_individual_index] == self.perfect_score:
+            self.finished = True
+
+    def get_phrase(self, i):
+        return self.problem.alphabet.decode(self.genes[i])
+
+    def is_finished(self):
+        return self.finished
+
+    def get_best(self):
+        return self.best
+
+    def get_generation(self):
+        return self.generation
+
+    def get_average_fitness(self):
+        return float(self.fitness.mean())
+
+    def get_phrases(self, limit=50):
+        limit = min(self.population_size, limit)
+        return ''.join(self.get_phrase(i) + "\n" for i in range(limit))
+
+# ______________________________________________________________________________
+def generations_per_second(population_class, target, population_size, mutation_rate, generations):
+    population = population_class(target, population_size, mutation_rate)
+    start = time()
+    for _ in range(generations):
+        population.natural_selection()
+        population.generate()
+        population.calculate_fitness()
+        population.evaluate()
+    return generations / (time() - start)
+
+def benchmark(target="To be or not to be.", mutation_rate=0.008, sizes=(500, 10_000, 100_000), generations=5):
+    for population_size in sizes:
+        array_speed = generations_per_second(ArrayPopulation, target, population_size, mutation_rate, generations)
+        list_speed = generations_per_second(Population, target, population_size, mutation_rate, max(1, generations // 5)) \
+                     if population_size <= 10_000 else None # a single list generation of 10^5 takes tens of seconds
+        print(f"population size {population_size:>7}: {array_speed:>9.2f} generations/s (array)", end="")
+        print(f", {list_speed:>7.2f} generations/s (list), {array_speed / list_speed:.0f}x" if list_speed else "")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,145 @@
+'''Island model: independent populations evolving in parallel processes, exchanging their best individuals'''
+
+import argparse
+import numpy as np
+
+from time import time
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from array_population import ArrayPopulation
+from selection import SELECTIONS
+
+TOPOLOGIES = ('ring', 'random')
+
+def evolve(island, generations):
+    # runs (at most) generations generations of the island, stopping early if it finds the target
+    for _ in range(generations):
+        if island.is_finished():
+            break
+        island.natural_selection()
+        island.generate()
+        island.calculate_fitness()
+        island.evaluate()
+    return island
+
+# ______________________________________________________________________________
+class IslandModel:
+    ''' n_islands ArrayPopulations of population_size individuals each, evolved in a pool of processes for
+        migration_interval generations at a time, after which each island sends copies of its migrants fittest
+        individuals to replace the least fit ones of another island, either:
+            'ring'   : island i always sends them to island i + 1
+            'random' : each island sends them to a random other island (a new permutation every migration)
+        Note: the same API as Population is kept, except that generate evolves every island for migration_interval
+              generations (an epoch), so get_generation (and run's max_generations) counts the islands' generations,
+              which advance by migration_interval at a time '''
+    def __init__(self, target, n_islands, population_size, mutation_rate, migration_interval=20, migrants=5,
+                 topology='ring', seed=None, selection=None, processes=None, problem=None):
+        if topology not in TOPOLOGIES:
+            raise ValueError(f"Unknown topology '{topology}', expected one of {TOPOLOGIES}")
+        self.target = target
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.topology = topology
+        self.processes = processes
+
+        seeds = np.random.SeedSequence(seed).spawn(n_islands + 1)
+        self.rng = np.random.default_rng(seeds[0]) # for the random topology
+        self.islands = [ArrayPopulation(target, population_size, mutation_rate, seed=island_seed, selection=selection,
+                                        problem=problem) for island_seed in seeds[1:]]
+
+        self.executor = None
+        self.best = ""
+        self.perfect_score = self.islands[0].perfect_score
+        self.finished = False
+
+    def __enter__(self):
+        if self.processes != 1:
+            self.executor = ProcessPoolExecutor(self.processes)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    # evolves every island for migration_interval generations (in parallel, inside a with block)
+    def generate(self):
+        if self.executor is None:
+            self.islands = [evolve(island, self.migration_interval) for island in self.islands]
+        else:
+            self.islands = list(self.executor.map(evolve, self.islands, repeat(self.migration_interval)))
+
+    def migrate(self):
+        n = len(self.islands)
+        if n < 2 or self.migrants == 0:
+            return
+        if self.topology == 'ring':
+            destinations = [(i + 1) % n for i in range(n)]
+        else:
+            # a random derangement, so that no island sends migrants to itself
+            destinations = self.rng.permutation(n)
+            while (destinations == np.arange(n)).any():
+                destinations = self.rng.permutation(n)
+        elites = [island.get_elite(self.migrants) for island in self.islands] # before any island receives migrants
+        for elite, destination in zip(elites, destinations):
+            self.islands[destination].replace_worst(elite)
+
+    # compute the current "most fit" member of all islands
+    def evaluate(self):
+        best_island = max(self.islands, key=lambda island: island.fitness.max())
+        best_island.evaluate()
+        self.best = best_island.get_best()
+        if any(island.is_finished() for island in self.islands):
+            self.finished = True
+
+    def is_finished(self):
+        return self.finished
+
+    def get_best(self):
+        return self.best
+
+    def get_generation(self):
+        # generations evolved by the islands (the same for all of them, unless one has stopped early)
+        return max(island.get_generation() for island in self.islands)
+
+    def get_average_fitness(self):
+        return float(np.mean([island.get_average_fitness() for island in self.islands]))
+
+    # runs epochs until an island finds the target (or max_generations generations have been evolved)
+    def run(self, max_generations=None, verbose=True):
+        while not self.is_finished() and (max_generations is None or self.get_generation() < max_generations):
+            self.generate()
+            self.evaluate()
+            if not self.is_finished():
+                self.migrate()
+            if verbose:
+                print(f"generation {self.get_generation():>6} | average fitness {self.get_average_fitness():.4f} | {self.get_best()}")
+        return self.get_best()
+
+# ______________________________________________________________________________
+def main():
+    args = get_parser().parse_args()
+    start = time()
+    with IslandModel(args.target, args.islands, args.population_size, args.mutation_rate, args.migration_interval,
+                     args.migrants, args.topology, args.seed, args.selection, args.processes) as model:
+        model.run(args.max_generations, verbose=not args.quiet)
+    print(f"Best phrase: {model.get_best()} (after {model.get_generation()} generations, in {time() - start:.2f}s)")
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Evolves a target phrase in parallel populations (islands) with migration")
+    parser.add_argument("--target", default="To be or not to be.", help="Target phrase")
+    parser.add_argument("--islands", "-n", type=int, default=4, help="Number of islands")
+    parser.add_argument("--population_size", type=int, default=500, help="Number of individuals in each island")
+    parser.add_argument("--mutation_rate", type=float, default=0.008, help="Chance of each gene being mutated")
+    parser.add_argument("--migration_interval", "-m", type=int, default=20, help="Generations between migrations")
+    parser.add_argument("--migrants", type=int, default=5, help="Individuals sent by each island at every migration")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="ring", help="Which island receives each island's migrants")
+    parser.add_argument("--selection", choices=SELECTIONS, default=None, help="Parent selection strategy (defaults to roulette)")
+    parser.add_argument("--processes", "-j", type=int, default=None, help="Number of processes (1 runs every island in this one)")
+    parser.add_argument("--max_generations", type=int, default=None, help="Stops after this many generations")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (for reproducible results)")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Only print the final result")
+    return parser
+
+if __name__ == "__main__":
+    main()
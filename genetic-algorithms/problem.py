@@ -0,0 +1,116 @@
+'''Fitness functions ("problems") for the genetic algorithms, evaluated on whole batches of genomes at once'''
+
+import numpy as np
+
+from collections import OrderedDict
+
+# ______________________________________________________________________________
+class Alphabet:
+    ''' The characters genes can take, precomputed once and shared by every individual
+        (genomes are (n, length) uint8 arrays of their character codes) '''
+    def __init__(self, chars):
+        self.chars = chars
+        self.codes = np.frombuffer(chars.encode('latin-1'), dtype=np.uint8).copy()
+        self.char_codes = self.codes.tolist() # as a list of ints, for DNA
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, text):
+        return set(text) <= set(self.chars)
+
+    def encode(self, text):
+        return np.frombuffer(text.encode('latin-1'), dtype=np.uint8)
+
+    def decode(self, genome):
+        return np.asarray(genome, dtype=np.uint8).tobytes().decode('latin-1')
+
+    def random(self, shape, rng):
+        return self.codes[rng.integers(0, len(self.codes), shape)]
+
+DEFAULT_ALPHABET = Alphabet(" .ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz")
+
+# ______________________________________________________________________________
+class Problem:
+    ''' Scores (n, length) uint8 arrays of genomes, returning an array of n fitness values (higher is better)
+        Note: perfect_score is the best possible fitness (if known), at which the evolution stops
+        Note: fitness proportionate selections (Roulette, StochasticUniversal) need non-negative values to weigh the odds,
+              so they shift negative ones (e.g. -cost) up by the lowest value, i.e. the odds are then relative to the worst
+              individual of each generation (return non-negative values, e.g. 1 / (1 + cost), to keep them absolute) '''
+    def __init__(self, length, alphabet=DEFAULT_ALPHABET, perfect_score=None):
+        self.length = length
+        self.alphabet = alphabet
+        self.perfect_score = perfect_score
+
+    def evaluate(self, genomes):
+        raise NotImplementedError
+
+class PhraseProblem(Problem):
+    ''' Fraction of the target phrase's characters matched by each genome '''
+    def __init__(self, target, alphabet=DEFAULT_ALPHABET):
+        if target not in alphabet:
+            raise ValueError(f"The target has characters outside the alphabet: {set(target) - set(alphabet.chars)}")
+        super().__init__(len(target), alphabet, perfect_score=1)
+        self.target = target
+        self.encoded_target = alphabet.encode(target)
+
+    def evaluate(self, genomes):
+        return (genomes == self.encoded_target).mean(axis=1)
+
+class FunctionProblem(Problem):
+    ''' A user supplied fitness function, called with the (n, length) uint8 array of a whole batch of genomes if batched,
+        or once per genome with its decoded string otherwise
+        Note: the function must be defined at a module's top level to be used with island_model's processes '''
+    def __init__(self, fitness_function, length, alphabet=DEFAULT_ALPHABET, perfect_score=None, batched=True):
+        super().__init__(length, alphabet, perfect_score)
+        self.fitness_function = fitness_function
+        self.batched = batched
+
+    def evaluate(self, genomes):
+        if self.batched:
+            return np.asarray(self.fitness_function(genomes), dtype=np.float64)
+        return np.fromiter((self.fitness_function(self.alphabet.decode(genome)) for genome in genomes),
+                           dtype=np.float64, count=len(genomes))
+
+class CachedProblem(Problem):
+    ''' Wraps an (expensive) problem, memoizing the fitness of up to maxsize genomes (least recently used ones are dropped),
+        and evaluating each distinct genome of a batch only once, as converged populations are full of duplicates '''
+    def __init__(self, problem, maxsize=100_000):
+        super().__init__(problem.length, problem.alphabet, problem.perfect_score)
+        self.problem = problem
+        self.maxsize = maxsize
+        self.cache = OrderedDict() # genome bytes -> fitness, from least to most recently used
+
+        self.hits = 0        # genomes whose fitness was cached
+        self.duplicates = 0  # genomes with the same genes as another one of their batch
+        self.evaluations = 0 # genomes actually evaluated by the problem
+
+    def evaluate(self, genomes):
+        genomes = np.ascontiguousarray(genomes, dtype=np.uint8)
+        keys = genomes.view(np.dtype((np.void, genomes.shape[1]))).ravel() # each genome as a single bytes value
+        unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        self.duplicates += len(keys) - len(unique_keys)
+
+        unique_fitness = np.empty(len(unique_keys), dtype=np.float64)
+        missing = []
+        for i, key in enumerate(unique_keys.tolist()):
+            fitness = self.cache.get(key)
+            if fitness is None:
+                missing.append(i)
+            else:
+                self.cache.move_to_end(key)
+                unique_fitness[i] = fitness
+        self.hits += len(unique_keys) - len(missing)
+
+        if missing:
+            unique_fitness[missing] = self.problem.evaluate(genomes[first[missing]])
+            self.evaluations += len(missing)
+            for i in missing:
+                self.cache[unique_keys[i].tobytes()] = unique_fitness[i]
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+        return unique_fitness[inverse.ravel()]
+
+    def stats(self):
+        return {'size': len(self.cache), 'maxsize': self.maxsize,
+                'hits': self.hits, 'duplicates': self.duplicates, 'evaluations': self.evaluations}
@@ -0,0 +1,101 @@
+'''Parent selection strategies that sample every pair of parents of a generation at once, without a mating pool'''
+
+import numpy as np
+
+# ______________________________________________________________________________
+def spin(cumulative_weights, n, rng):
+    # picks n indices with odds proportional to their weights, by binary searching random points of the "roulette wheel"
+    if cumulative_weights[-1] <= 0:
+        return rng.integers(0, len(cumulative_weights), n) # every weight is zero, so all are equally likely
+    points = np.sort(rng.random(n)) * cumulative_weights[-1] # searching sorted points is several times faster
+    return np.searchsorted(cumulative_weights, points, side='right')
+
+def pair(indices, rng):
+    # shuffles the 2 * n selected indices into a (2, n) array of random pairs of parents
+    rng.shuffle(indices)
+    return indices.reshape(2, -1)
+
+def shift_negative(fitness):
+    # shifts fitness values so that the least fit one is 0 if any of them is negative (as odds can't be negative),
+    # leaving non-negative ones untouched
+    min_fitness = fitness.min()
+    return fitness - min_fitness if min_fitness < 0 else fitness
+
+def pool_weights(fitness, pool_size=100):
+    # number of times each individual would be added to a mating pool where the fittest one appears pool_size times
+    max_fitness = fitness.max()
+    return np.floor(fitness / max_fitness * pool_size) if max_fitness > 0 else np.zeros_like(fitness)
+
+# ______________________________________________________________________________
+class Selection:
+    ''' Picks n pairs of parents from the fitness of each individual, returning them as a (2, n) array of indices
+        Note: rng is a numpy.random.Generator '''
+    def __call__(self, fitness, n, rng):
+        raise NotImplementedError
+
+class Roulette(Selection):
+    ''' Fitness proportionate selection (the odds of Population's original mating pool, with pool_size=100)
+        Note: set pool_size to None to use the fitness values themselves as weights
+        Note: negative fitness values are first shifted up (see shift_negative), so the least fit individual is never picked '''
+    def __init__(self, pool_size=100):
+        self.pool_size = pool_size
+
+    def weights(self, fitness):
+        fitness = shift_negative(fitness)
+        return pool_weights(fitness, self.pool_size) if self.pool_size is not None else fitness
+
+    def __call__(self, fitness, n, rng):
+        cumulative_weights = np.cumsum(self.weights(np.asarray(fitness, dtype=np.float64)))
+        return pair(spin(cumulative_weights, 2 * n, rng), rng)
+
+class StochasticUniversal(Roulette):
+    ''' Same odds as Roulette, but spins a wheel of evenly spaced pointers once, so that
+        each individual is picked (almost exactly) in proportion to its weight '''
+    def __call__(self, fitness, n, rng):
+        cumulative_weights = np.cumsum(self.weights(np.asarray(fitness, dtype=np.float64)))
+        if cumulative_weights[-1] <= 0:
+            return pair(rng.integers(0, len(cumulative_weights), 2 * n), rng)
+        points = (rng.random() + np.arange(2 * n)) * (cumulative_weights[-1] / (2 * n))
+        return pair(np.searchsorted(cumulative_weights, points, side='right'), rng)
+
+class Tournament(Selection):
+    ''' Each parent is the fittest of size random individuals (larger tournaments mean stronger selection) '''
+    def __init__(self, size=3):
+        self.size = size
+
+    def __call__(self, fitness, n, rng):
+        fitness = np.asarray(fitness)
+        contestants = rng.integers(0, len(fitness), (2 * n, self.size))
+        winners = contestants[np.arange(2 * n), fitness[contestants].argmax(axis=1)]
+        return winners.reshape(2, n)
+
+class Rank(Selection):
+    ''' Linear ranking: the odds depend only on the order of the fitness values, going from 2 - pressure
+        for the least fit individual to pressure for the fittest (with pressure in [1, 2]) '''
+    def __init__(self, pressure=1.5):
+        self.pressure = pressure
+
+    def __call__(self, fitness, n, rng):
+        fitness = np.asarray(fitness)
+        ranks = np.empty(len(fitness))
+        ranks[np.argsort(fitness, kind='stable')] = np.arange(len(fitness)) / max(len(fitness) - 1, 1)
+        weights = (2 - self.pressure) + 2 * (self.pressure - 1) * ranks
+        return pair(spin(np.cumsum(weights), 2 * n, rng), rng)
+
+SELECTIONS = {
+    'roulette': Roulette,
+    'sus': StochasticUniversal,
+    'tournament': Tournament,
+    'rank': Rank,
+}
+
+def get_selection(selection):
+    # accepts a Selection instance, or the name of one in SELECTIONS (with its default parameters)
+    if selection is None:
+        return Roulette()
+    if isinstance(selection, str):
+        try:
+            return SELECTIONS[selection]()
+        except KeyError:
+            raise ValueError(f"Unknown selection '{selection}', expected one of {list(SELECTIONS)}") from None
+    return selection
@@ -2,28 +2,32 @@
 
 '''Finding the "To be or not to be." string through evolution'''
 
+import os
+import csv
+import json
 import random
-from math import floor
+import argparse
+import numpy as np
 
-from os import system, name
-# clears the console
-def clear():
-    if name == 'nt': 
-        _ = system('cls') 
-    else: 
-        _ = system('clear')  
+from time import perf_counter
+from problem import DEFAULT_ALPHABET, PhraseProblem
+from selection import SELECTIONS, get_selection
 
-# maps a value v from [low1, high1] to a value in [low2, high2]
-def bound(v, low1, high1, low2, high2):
-    return (v - low1) * ((high2-low2) / (high1-low1)) + low2
+# clears the console (with ANSI escape codes, instead of spawning a 'clear' process every generation)
+# Note: legacy Windows consoles print the escape codes literally, so 'cls' is still used there
+def clear():
+    if os.name == 'nt':
+        _ = os.system('cls')
+    else:
+        print("\033[H\033[J", end="")
 
 # ______________________________________________________________________________
 class DNA:
-    def __init__(self, length):
-        self.char_codes = [ord(' '), ord('.')] + list(range(ord('A'), ord('Z') + 1)) + list(range(ord('a'), ord('z') + 1))
+    def __init__(self, length, char_codes=DEFAULT_ALPHABET.char_codes, genes=None):
+        self.char_codes = char_codes # shared by every individual
         self.fitness = 0
         self.length = length
-        self.genes = [chr(random.choice(self.char_codes)) for _ in range(self.length)]
+        self.genes = genes if genes is not None else [chr(random.choice(self.char_codes)) for _ in range(self.length)]
     
     def get_phrase(self):
         return ''.join(self.genes)
@@ -36,14 +40,9 @@ class DNA:
         self.fitness = score / len(target)
     
     def crossover(self, partner):
-        child = DNA(len(self.genes))
-        
         # selects a "midpoint" and gets half of self's genes and half of partner's
         midpoint = random.randint(0, self.length - 1)
-        for i in range(self.length):
-            child.genes[i] = self.genes[i] if i < midpoint else partner.genes[i]
-        
-        return child
+        return DNA(self.length, self.char_codes, self.genes[:midpoint] + partner.genes[midpoint:])
     
     def mutate(self, mutation_rate):
         for i in range(self.length):
@@ -52,38 +51,41 @@ class DNA:
 
 # ______________________________________________________________________________
 class Population:
-    def __init__(self, target, population_size, mutation_rate):
+    def __init__(self, target, population_size, mutation_rate, selection=None, problem=None):
+        self.problem = problem if problem is not None else PhraseProblem(target) # see problem.py
         self.target = target
         self.mutation_rate = mutation_rate
         self.population_size = population_size
-        self.population = [DNA(len(self.target)) for _ in range(self.population_size)]
+        self.population = [DNA(self.problem.length, self.problem.alphabet.char_codes) for _ in range(self.population_size)]
         
-        self.mating_pool = list() # individuals added proportionally to it's fitness
+        self.selection = get_selection(selection) # defaults to roulette wheel selection (see selection.py)
+        self.rng = np.random.default_rng(random.getrandbits(64)) # so that random.seed() also seeds the selection
+        self.parents = None # (2, population_size) indices of each child's parents
         self.generation = 0
         self.best = ""
-        self.perfect_score = 1
+        self.perfect_score = self.problem.perfect_score
 
         self.finished = False
         self.calculate_fitness()
     
+    # evaluates the whole population in a single batch
     def calculate_fitness(self):
-        for individual in self.population:
-            individual.calculate_fitness(self.target)
+        genomes = np.frombuffer(''.join(individual.get_phrase() for individual in self.population).encode('latin-1'),
+                                dtype=np.uint8).reshape(self.population_size, self.problem.length)
+        for individual, fitness in zip(self.population, self.problem.evaluate(genomes).tolist()):
+            individual.fitness = fitness
     
-    # makes a new mating pool based on roulette wheel selection
+    # picks the parents of the next generation
     def natural_selection(self):
-        self.mating_pool = list() # clears the pool
-        max_fitness = max(map(lambda individual: individual.fitness, self.population))
-        for individual in self.population:
-            n = floor(bound(individual.fitness, 0, max_fitness, 0, 100)) # number of times to add it on the mating pool
-            for _ in range(n):
-                self.mating_pool.append(individual)
+        fitness = np.fromiter((individual.fitness for individual in self.population), dtype=np.float64)
+        self.parents = self.selection(fitness, self.population_size, self.rng)
     
     # creates a new generation
     def generate(self):
-        for i in range(self.population_size):
-            partner1 = random.choice(self.mating_pool)
-            partner2 = random.choice(self.mating_pool)
+        parents = self.population[:] # as self.population is overwritten
+        for i, (p1, p2) in enumerate(zip(*self.parents.tolist())):
+            partner1 = parents[p1]
+            partner2 = parents[p2]
             
             child = partner1.crossover(partner2)
             child.mutate(self.mutation_rate)
@@ -124,24 +126,106 @@ class Population:
         return phrases
 
 # ______________________________________________________________________________
-# TODO play with the following values for different results
-target_phrase   = "To be or not to be." # (changing this may require adding new values to Population's char_codes)
-population_size = 500
-mutation_rate   = 0.008
-
-population = Population(target_phrase, population_size, mutation_rate)
-
-while not population.is_finished():
-    population.natural_selection() # makes a new mating pool
-    population.generate() # creates the next generation
-    population.calculate_fitness()
-
-    population.evaluate()
-    display_info = f"population size:   {population_size}\n" + \
-                   f"mutation rate:     {mutation_rate * 100}%\n" + \
-                   f"total generations: {population.get_generation()}\n" + \
-                   f"average fitness:   {population.get_average_fitness():.4f}\n" + \
-                   f"Best phrase: \n {population.get_best()}\n"
-
-    clear()
-    print(display_info)
\ No newline at end of file
+PHASES = ('selection', 'generation', 'fitness', 'evaluation')
+
+class MetricsWriter:
+    ''' Writes one row of metrics per generation to a .csv or a .jsonl (JSON lines) file '''
+    FIELDS = ('generation', 'best_fitness', 'average_fitness', 'best') + tuple(f"{phase}_time" for phase in PHASES)
+
+    def __init__(self, fname):
+        self.file = open(fname, 'w', newline='')
+        self.jsonl = fname.endswith('.jsonl')
+        if not self.jsonl:
+            self.writer = csv.DictWriter(self.file, fieldnames=self.FIELDS)
+            self.writer.writeheader()
+
+    def write(self, metrics):
+        if self.jsonl:
+            self.file.write(json.dumps(metrics) + "\n")
+        else:
+            self.writer.writerow(metrics)
+
+    def close(self):
+        self.file.close()
+
+def best_fitness(population):
+    if hasattr(population, 'fitness'): # ArrayPopulation
+        return float(population.fitness.max())
+    return max(individual.fitness for individual in population.population)
+
+def make_population(target, population_size, mutation_rate, seed=None, engine='list', selection=None):
+    if engine == 'array':
+        from array_population import ArrayPopulation # imported here, as it imports this module
+        return ArrayPopulation(target, population_size, mutation_rate, seed=seed, selection=selection)
+    random.seed(seed)
+    return Population(target, population_size, mutation_rate, selection=selection)
+
+def run(population, max_generations=None, report_interval=1, report=None, metrics=None):
+    '''
+    Evolves the population until it finds its target (or max_generations generations have passed),
+    calling report(population) every report_interval generations (and after the last one) and
+    writing each generation's fitness and time spent in each phase (in seconds) to metrics (a MetricsWriter)
+    '''
+    steps = (population.natural_selection, population.generate, population.calculate_fitness, population.evaluate)
+    while not population.is_finished():
+        if max_generations is not None and population.get_generation() >= max_generations:
+            break
+        times = {}
+        for phase, step in zip(PHASES, steps):
+            start = perf_counter()
+            step()
+            times[f"{phase}_time"] = perf_counter() - start
+
+        generation = population.get_generation()
+        if metrics is not None:
+            metrics.write({'generation': generation, 'best_fitness': best_fitness(population),
+                           'average_fitness': population.get_average_fitness(), 'best': population.get_best(), **times})
+        if report is not None and report_interval and generation % report_interval == 0 and not population.is_finished():
+            report(population)
+    if report is not None:
+        report(population)
+    return population.get_best()
+
+def main():
+    args = get_parser().parse_args()
+    population = make_population(args.target, args.population_size, args.mutation_rate, args.seed, args.engine, args.selection)
+
+    def display(population):
+        display_info = f"population size:   {args.population_size}\n" + \
+                       f"mutation rate:     {args.mutation_rate * 100}%\n" + \
+                       f"total generations: {population.get_generation()}\n" + \
+                       f"average fitness:   {population.get_average_fitness():.4f}\n" + \
+                       f"Best phrase: \n {population.get_best()}\n"
+        clear()
+        print(display_info)
+
+    def log(population):
+        print(f"generation {population.get_generation():>6} | average fitness {population.get_average_fitness():.4f} | "
+              f"{population.get_best()}")
+
+    metrics = MetricsWriter(args.metrics) if args.metrics else None
+    start = perf_counter()
+    try:
+        run(population, args.max_generations, args.report_interval, log if args.headless else display, metrics)
+    finally:
+        if metrics is not None:
+            metrics.close()
+    if args.headless:
+        print(f"Finished after {population.get_generation()} generations in {perf_counter() - start:.2f}s")
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Finds a target phrase through evolution")
+    parser.add_argument("--target", default="To be or not to be.", help="Target phrase (made of the characters in problem.DEFAULT_ALPHABET)")
+    parser.add_argument("--population_size", "-p", type=int, default=500, help="Number of individuals")
+    parser.add_argument("--mutation_rate", "-m", type=float, default=0.008, help="Chance of each gene being mutated")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (for reproducible results)")
+    parser.add_argument("--engine", choices=("list", "array"), default="list", help="Population implementation ('array' is array_population's)")
+    parser.add_argument("--selection", choices=SELECTIONS, default=None, help="Parent selection strategy (defaults to roulette)")
+    parser.add_argument("--max_generations", type=int, default=None, help="Stops after this many generations")
+    parser.add_argument("--headless", action="store_true", help="Prints a line per report instead of redrawing the terminal")
+    parser.add_argument("--report_interval", type=int, default=1, help="Generations between reports (0 only reports the result)")
+    parser.add_argument("--metrics", help="Writes per generation metrics and phase timings to this .csv or .jsonl file")
+    return parser
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,300 @@
-print(["condescendences"[i:i+2] for i in range(len("condescendences")-1)])
-s = "Two roads diverged in a yellow wood, And sorry I"
-s = s.split(" ")
-s = [' '.join(s[i:i+5]) for i in range(len(s) - 4)]
-print(s)
-print(list(map(lambda x: len(x.split(' ')), s)))
-
-def ngram_to_next_dict(src, order, model={}):
-    src += '$'
+import os
+import numpy as np
+
+from functools import partial
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+END = '$' # appended to the end of every text (so that its last n-gram also has a next token)
+CHUNK_SIZE = 1 << 20 # characters read at a time
+
+def ngram_to_next_dict(src, order, model=None):
+    if model is None:
+        model = {}
+    src += END
     for i in range(len(src) - order):
         ngram = tuple(src[i : i+order])
         next = src[i + order]
-        try: 
+        try:
             model[ngram].append(next)
-        except: 
+        except:
             model[ngram] = [next]
-    return model
\ No newline at end of file
+    return model
+
+def count_ngrams(src, order):
+    # {(token_1, ..., token_order, next_token): count}, i.e. the counts of the lists in ngram_to_next_dict
+    src += END
+    return Counter(zip(*(src[i:] for i in range(order + 1))))
+
+def read_chunks(fname, chunk_size=CHUNK_SIZE):
+    with open(fname, encoding='utf-8', errors='replace') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def tokenize(chunks, level='char'):
+    '''
+    Yields the tokens of a stream of text chunks, either one list of words (split on whitespace, as in
+    the 5-word n-grams example) or one string of characters per chunk
+    Note: a word split between two chunks is held back until the next chunk is read
+    '''
+    if level == 'char':
+        yield from chunks
+        return
+    if level != 'word':
+        raise ValueError(f"Unknown token level '{level}', expected 'char' or 'word'")
+    carry = ''
+    for chunk in chunks:
+        chunk = carry + chunk
+        carry = ''
+        if chunk and not chunk[-1].isspace():
+            words = chunk.split()
+            carry = words.pop() if words else ''
+        else:
+            words = chunk.split()
+        yield words
+    yield [carry] if carry else []
+
+def count_stream(chunks, order, level='char', counts=None):
+    '''
+    Counts the n-grams of a stream of text chunks (any iterable of str), carrying the last order tokens of
+    each chunk over to the next one, so the whole text never needs to be in memory
+    Note: the result is the same as count_ngrams' on the concatenated chunks (for level='char')
+    '''
+    counts = Counter() if counts is None else counts
+    context = [] if level == 'word' else ''
+    for tokens in tokenize(chunks, level):
+        tokens = context + tokens
+        counts.update(zip(*(tokens[i:] for i in range(order + 1))))
+        context = tokens[len(tokens) - order:] if len(tokens) > order else tokens
+    counts.update(zip(*((context + ([END] if level == 'word' else END))[i:] for i in range(order + 1))))
+    return counts
+
+def count_files(fnames, order, level='char', chunk_size=CHUNK_SIZE):
+    # counts the n-grams of each file (as a separate text) into a single Counter
+    counts = Counter()
+    for fname in fnames:
+        count_stream(read_chunks(fname, chunk_size), order, level, counts)
+    return counts
+
+def train(chunks, order, level='char'):
+    return NgramModel.from_counts(order, count_stream(chunks, order, level))
+
+def train_files(fnames, order, level='char', processes=None, chunk_size=CHUNK_SIZE):
+    '''
+    Trains a model on every file in fnames, sharding them over a pool of processes (defaults to one per CPU)
+    and merging the count tables of each shard
+    '''
+    processes = min(processes or os.cpu_count() or 1, len(fnames))
+    if processes <= 1:
+        return NgramModel.from_counts(order, count_files(fnames, order, level, chunk_size))
+
+    shards = [fnames[i::processes] for i in range(processes)]
+    counts = Counter()
+    with ProcessPoolExecutor(processes) as executor:
+        for shard_counts in executor.map(partial(count_files, order=order, level=level, chunk_size=chunk_size), shards):
+            counts.update(shard_counts)
+    return NgramModel.from_counts(order, counts)
+
+def _pack_strings(strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+def _unpack_strings(blob, offsets):
+    blob = blob.tobytes()
+    return [blob[start:end].decode('utf-8') for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+def alias_tables(offsets, weights):
+    '''
+    Builds Walker's alias tables (with Vose's method) for the weights of each offsets[i]:offsets[i + 1] group,
+    so that sampling an entry takes a single uniform random number, a table lookup and a comparison
+    '''
+    alias_prob = np.ones(len(weights), dtype=np.float64)
+    alias = np.zeros(len(weights), dtype=np.uint32)
+    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        n = end - start
+        if n == 1:
+            continue
+        prob = (weights[start:end] * (n / weights[start:end].sum())).tolist()
+        small = [i for i, p in enumerate(prob) if p < 1]
+        large = [i for i, p in enumerate(prob) if p >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            alias_prob[start + s] = prob[s]
+            alias[start + s] = l
+            prob[l] -= 1 - prob[s]
+            (small if prob[l] < 1 else large).append(l)
+        # what's left has probability 1 (up to rounding errors)
+        for i in small + large:
+            alias_prob[start + i] = 1
+            alias[start + i] = i
+    return alias_prob, alias
+
+class NgramModel:
+    '''
+    Compact n-gram model: tokens are interned into integer ids, and the next-token counts of every context
+    (i.e. n-gram) are stored in flat arrays, instead of keeping a list with every observed next token
+    Note: contexts are stored as sorted big-endian rows, so that they can be binary searched as raw bytes
+    '''
+    FORMAT_VERSION = 1
+
+    def __init__(self, order, vocab, contexts, offsets, next_ids, counts):
+        self.order = order
+        self.vocab = list(vocab)                                     # token id -> token
+        self.token_ids = {token: i for i, token in enumerate(vocab)} # token -> token id
+        self.contexts = np.ascontiguousarray(contexts, dtype='>u4')  # (n_contexts, order) token ids
+        self.offsets = np.asarray(offsets, dtype=np.int64)           # (n_contexts + 1,) start of each context's entries
+        self.next_ids = np.asarray(next_ids, dtype=np.uint32)        # (n_entries,) next token ids
+        self.counts = np.asarray(counts, dtype=np.uint32)            # (n_entries,) next token counts
+        self.context_keys = self.contexts.view(f'V{4 * order}').ravel()
+        # packed integer keys are much faster to binary search than raw bytes (but they must fit in 64 bits)
+        self.powers = len(self.vocab) ** np.arange(order - 1, -1, -1, dtype=np.uint64)
+        self.packed_keys = self.contexts.astype(np.uint64) @ self.powers if len(self.vocab) ** order < 2 ** 64 else None
+        self.alias_prob = None # alias tables for O(1) sampling of each context's next token (built when first needed)
+        self.alias = None
+
+    def __len__(self):
+        return len(self.contexts)
+
+    @classmethod
+    def from_counts(cls, order, counts):
+        '''
+        Builds the model from a {(token_1, ..., token_order, next_token): count} mapping (e.g. count_ngrams' result)
+        '''
+        vocab = sorted({token for ngram in counts for token in ngram})
+        token_ids = {token: i for i, token in enumerate(vocab)}
+        # since ids follow the vocabulary order, sorting the n-grams also sorts their id rows
+        ngrams = sorted(counts)
+        ids = np.array([[token_ids[token] for token in ngram] for ngram in ngrams], dtype=np.uint32).reshape(-1, order + 1)
+        return cls.from_ids(order, vocab, ids, np.fromiter((counts[ngram] for ngram in ngrams), dtype=np.uint32, count=len(ngrams)))
+
+    @classmethod
+    def from_ids(cls, order, vocab, ids, counts):
+        # builds the model from sorted (n_entries, order + 1) rows of token ids and their counts
+        is_new_context = np.ones(len(ids), dtype=bool)
+        is_new_context[1:] = np.any(ids[1:, :order] != ids[:-1, :order], axis=1)
+        starts = np.flatnonzero(is_new_context)
+        offsets = np.append(starts, len(ids))
+        return cls(order, vocab, ids[starts, :order], offsets, ids[:, order], counts)
+
+    @classmethod
+    def from_dict(cls, model):
+        '''
+        Builds the model from the {ngram: [next, ...]} dict of ngram_to_next_dict
+        '''
+        order = len(next(iter(model)))
+        return cls.from_counts(order, Counter({ngram + (next,): count
+                                               for ngram, nexts in model.items()
+                                               for next, count in Counter(nexts).items()}))
+
+    @classmethod
+    def fit(cls, src, order):
+        return cls.from_counts(order, count_ngrams(src, order))
+
+    def ngram_counts(self):
+        # inverse of from_counts
+        lengths = np.diff(self.offsets)
+        rows = np.repeat(self.contexts.astype(np.uint32), lengths, axis=0)
+        return Counter({tuple(self.vocab[i] for i in row) + (self.vocab[next_id],): count
+                        for row, next_id, count in zip(rows.tolist(), self.next_ids.tolist(), self.counts.tolist())})
+
+    def lower_order(self):
+        '''
+        Returns the model of order - 1 (with the same vocabulary), summing the counts of the contexts that share a suffix
+        '''
+        if self.order < 2:
+            raise ValueError("There's no lower order model for an order 1 model")
+        rows = np.column_stack([np.repeat(self.contexts[:, 1:].astype(np.uint32), np.diff(self.offsets), axis=0), self.next_ids])
+        ids, inverse = np.unique(rows, axis=0, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=self.counts, minlength=len(ids)).astype(np.uint32)
+        return NgramModel.from_ids(self.order - 1, self.vocab, ids, counts)
+
+    def lookup(self, contexts):
+        '''
+        Returns the index of each (m, order) row of token ids in contexts, or -1 for unseen contexts
+        '''
+        contexts = np.asarray(contexts).reshape(-1, self.order)
+        if self.packed_keys is not None:
+            context_keys, keys = self.packed_keys, contexts.astype(np.uint64) @ self.powers
+        else:
+            context_keys = self.context_keys
+            keys = np.ascontiguousarray(contexts, dtype='>u4').view(f'V{4 * self.order}').ravel()
+        indices = np.searchsorted(context_keys, keys)
+        indices[indices == len(context_keys)] = 0
+        found = len(context_keys) != 0 and context_keys[indices] == keys
+        return np.where(found, indices, -1)
+
+    def context_index(self, ngram):
+        # index of a tuple of tokens, or -1 if it wasn't seen in training
+        try:
+            ids = [self.token_ids[token] for token in ngram]
+        except KeyError:
+            return -1
+        return int(self.lookup(np.array([ids]))[0])
+
+    def next_counts(self, ngram):
+        # {next_token: count} for a tuple of tokens
+        i = self.context_index(ngram)
+        if i == -1:
+            return {}
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return {self.vocab[next_id]: count for next_id, count in zip(self.next_ids[start:end].tolist(), self.counts[start:end].tolist())}
+
+    # __________________________________________________________________________
+
+    def build_alias_tables(self):
+        self.alias_prob, self.alias = alias_tables(self.offsets, self.counts)
+
+    def sample_ids(self, context_indices, u, tables=None):
+        '''
+        Samples the next token id of each context index, given one uniform [0, 1) random number per context
+        Note: tables can be used to sample from other (alias_prob, alias) tables than the ones of the counts
+        '''
+        if tables is None:
+            if self.alias_prob is None:
+                self.build_alias_tables()
+            tables = (self.alias_prob, self.alias)
+        alias_prob, alias = tables
+        start = self.offsets[context_indices]
+        u = u * (self.offsets[np.asarray(context_indices) + 1] - start)
+        column = u.astype(np.int64)
+        entry = start + column
+        column = np.where(u - column < alias_prob[entry], column, alias[entry])
+        return self.next_ids[start + column]
+
+    def sample(self, ngram, rng=np.random):
+        # samples a next token for a tuple of tokens (returns None if it wasn't seen in training)
+        i = self.context_index(ngram)
+        if i == -1:
+            return None
+        return self.vocab[int(self.sample_ids(np.array([i]), np.array([rng.random()]))[0])]
+
+    # __________________________________________________________________________
+
+    def save(self, fname):
+        vocab_blob, vocab_offsets = _pack_strings(self.vocab)
+        with open(fname, 'wb') as f:
+            np.savez(f, version=self.FORMAT_VERSION, order=self.order,
+                     vocab_blob=vocab_blob, vocab_offsets=vocab_offsets,
+                     contexts=self.contexts.astype(np.uint32), offsets=self.offsets,
+                     next_ids=self.next_ids, counts=self.counts)
+
+    @classmethod
+    def load(cls, fname):
+        with np.load(fname) as data:
+            if int(data['version']) != cls.FORMAT_VERSION:
+                raise ValueError(f"'{fname}' has n-gram model format version {int(data['version'])}, expected {cls.FORMAT_VERSION}")
+            return cls(int(data['order']), _unpack_strings(data['vocab_blob'], data['vocab_offsets']),
+                       data['contexts'], data['offsets'], data['next_ids'], data['counts'])
+
+if __name__ == "__main__":
+    print(["condescendences"[i:i+2] for i in range(len("condescendences")-1)])
+    s = "Two roads diverged in a yellow wood, And sorry I"
+    s = s.split(" ")
+    s = [' '.join(s[i:i+5]) for i in range(len(s) - 4)]
+    print(s)
+    print(list(map(lambda x: len(x.split(' ')), s)))
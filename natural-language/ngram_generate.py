@@ -0,0 +1,193 @@
+'''Batched text generation from n-gram models, with backoff to lower orders for unseen contexts'''
+
+import random
+import argparse
+import numpy as np
+
+from time import time
+from ngram import NgramModel, alias_tables, ngram_to_next_dict, read_chunks, train_files
+
+BACKOFFS = ('stupid', 'katz')
+
+class NgramGenerator:
+    '''
+    Generates many sequences in parallel: every step looks up the contexts of all sequences at once and samples
+    their next tokens from the model's alias tables. When a context wasn't seen in training, it backs off to the
+    longest seen suffix of it (down to a unigram distribution, which always exists)
+
+    Backoff methods:
+        'stupid' : uses the distribution of the longest seen suffix (stupid backoff's 0.4 factor only changes the
+                   scores of unseen continuations, so sampling always follows the longest match)
+        'katz'   : absolute discounting, i.e. each seen context keeps discount * n_types / total of its mass for
+                   the lower orders, and its seen tokens are sampled in proportion to count - discount
+                   Note: unlike proper Katz backoff, the lower order isn't renormalized to exclude the seen tokens
+    '''
+    def __init__(self, model, backoff='stupid', discount=0.5):
+        if backoff not in BACKOFFS:
+            raise ValueError(f"Unknown backoff '{backoff}', expected one of {BACKOFFS}")
+        if not 0 <= discount < 1:
+            # as every count is at least 1, this keeps each seen token's count - discount weight positive
+            raise ValueError(f"The discount must be in [0, 1), got {discount}")
+        self.backoff = backoff
+        self.discount = discount
+
+        self.models = [model] # from the highest order down to order 1
+        while self.models[-1].order > 1:
+            self.models.append(self.models[-1].lower_order())
+
+        unigram = self.models[-1]
+        self.unigram = np.bincount(unigram.next_ids, weights=unigram.counts, minlength=len(model.vocab)).cumsum()
+        self.unigram /= self.unigram[-1]
+
+        if backoff == 'stupid':
+            for m in self.models:
+                m.build_alias_tables()
+        else:
+            self.tables, self.reserved = [], []
+            for m in self.models:
+                totals = np.add.reduceat(m.counts.astype(np.float64), m.offsets[:-1]) if len(m) != 0 else np.zeros(0)
+                self.reserved.append(discount * np.diff(m.offsets) / totals)
+                self.tables.append(alias_tables(m.offsets, m.counts - discount))
+
+    @property
+    def order(self):
+        return self.models[0].order
+
+    @property
+    def vocab(self):
+        return self.models[0].vocab
+
+    def start_contexts(self, n, rng):
+        # samples n contexts of the highest order model, in proportion to how often each one was seen
+        model = self.models[0]
+        weights = np.add.reduceat(model.counts.astype(np.float64), model.offsets[:-1])
+        return model.contexts[rng.choice(len(model), size=n, p=weights / weights.sum())].astype(np.uint32)
+
+    def step(self, contexts, rng):
+        '''
+        Samples the next token id of each (n, order) row of token ids in contexts
+        '''
+        n = len(contexts)
+        next_ids = np.empty(n, dtype=np.uint32)
+        pending = np.arange(n)
+        for level, model in enumerate(self.models):
+            if len(pending) == 0:
+                return next_ids
+            indices = model.lookup(contexts[pending, level:])
+            found = indices >= 0
+            if self.backoff == 'katz':
+                # backs off (even from seen contexts) with probability equal to their reserved mass
+                found[found] = rng.random(found.sum()) >= self.reserved[level][indices[found]]
+            if found.any():
+                tables = self.tables[level] if self.backoff == 'katz' else None
+                next_ids[pending[found]] = model.sample_ids(indices[found], rng.random(found.sum()), tables)
+            pending = pending[~found]
+        next_ids[pending] = np.searchsorted(self.unigram, rng.random(len(pending)), side='right')
+        return next_ids
+
+    def generate_ids(self, n_sequences, length, seed=None, contexts=None):
+        '''
+        Returns an (n_sequences, order + length) array of token ids, where the first order columns are the starting
+        contexts (sampled from the model if not given) and the following ones are the generated tokens
+        '''
+        rng = np.random.default_rng(seed)
+        ids = np.empty((n_sequences, self.order + length), dtype=np.uint32)
+        ids[:, :self.order] = self.start_contexts(n_sequences, rng) if contexts is None else contexts
+        for t in range(length):
+            ids[:, self.order + t] = self.step(ids[:, t:t + self.order], rng)
+        return ids
+
+    def generate(self, n_sequences, length, seed=None, separator=''):
+        '''
+        Returns n_sequences strings with length generated tokens each (plus their starting contexts),
+        joined by separator (i.e. use ' ' for word-level models)
+        '''
+        vocab = np.array(self.vocab, dtype=object)
+        return [separator.join(row) for row in vocab[self.generate_ids(n_sequences, length, seed)]]
+
+# ______________________________________________________________________________
+
+def generate_naive(model, n_sequences, length, seed=None):
+    '''
+    Reference one-token-at-a-time generator over the dict of ngram_to_next_dict, restarting from a
+    random context whenever the current one wasn't seen in training
+    '''
+    rand = random.Random(seed)
+    contexts = list(model)
+    sequences = []
+    for _ in range(n_sequences):
+        context = rand.choice(contexts)
+        sequence = list(context)
+        for _ in range(length):
+            nexts = model.get(context)
+            if nexts is None:
+                context = rand.choice(contexts)
+                nexts = model[context]
+            sequence.append(rand.choice(nexts))
+            context = context[1:] + (sequence[-1],)
+        sequences.append(sequence)
+    return sequences
+
+def benchmark(text, order, n_sequences, length, seed=0, backoff='stupid'):
+    '''
+    Compares the tokens per second of NgramGenerator with the naive random.choice loop on a character-level model
+    '''
+    start = time()
+    naive = ngram_to_next_dict(text, order)
+    naive_train = time() - start
+    start = time()
+    generate_naive(naive, n_sequences, length, seed)
+    naive_time = time() - start
+
+    start = time()
+    generator = NgramGenerator(NgramModel.fit(text, order), backoff=backoff)
+    generator_train = time() - start
+    start = time()
+    generator.generate_ids(n_sequences, length, seed)
+    generator_time = time() - start
+
+    n_tokens = n_sequences * length
+    print(f"naive     : {n_tokens / naive_time:>12,.0f} tokens/s (training: {naive_train:.2f}s)")
+    print(f"vectorized: {n_tokens / generator_time:>12,.0f} tokens/s (training: {generator_train:.2f}s)")
+    print(f"speedup   : {naive_time / generator_time:.1f}x")
+
+def main():
+    args = get_parser().parse_args()
+
+    if args.benchmark:
+        text = ''.join(''.join(read_chunks(fname)) for fname in args.corpus)
+        benchmark(text, args.order, args.sequences, args.length, args.seed, args.backoff)
+        return
+
+    model = NgramModel.load(args.corpus[0]) if args.corpus[0].endswith('.npz') else \
+            train_files(args.corpus, args.order, args.level, args.processes)
+    if args.save:
+        model.save(args.save)
+
+    generator = NgramGenerator(model, backoff=args.backoff, discount=args.discount)
+    start = time()
+    sequences = generator.generate(args.sequences, args.length, args.seed, separator=' ' if args.level == 'word' else '')
+    elapsed = time() - start
+    for sequence in sequences[:args.show]:
+        print(f"{sequence}\n")
+    print(f"Generated {args.sequences * args.length:,} tokens in {elapsed:.2f}s "
+          f"({args.sequences * args.length / elapsed:,.0f} tokens/s)")
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Generate text from a character or word level n-gram model")
+    parser.add_argument("corpus", nargs="+", help="Text files to train on (or a single .npz model saved with NgramModel.save)")
+    parser.add_argument("--order", "-n", type=int, default=5, help="Number of tokens in each context")
+    parser.add_argument("--level", choices=("char", "word"), default="char", help="Token level")
+    parser.add_argument("--processes", "-j", type=int, default=None, help="Number of training processes")
+    parser.add_argument("--save", help="Saves the trained model to this .npz file")
+    parser.add_argument("--sequences", type=int, default=1000, help="Number of sequences generated in parallel")
+    parser.add_argument("--length", type=int, default=200, help="Number of tokens generated for each sequence")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (for reproducible results)")
+    parser.add_argument("--backoff", choices=BACKOFFS, default="stupid", help="Backoff method for unseen contexts")
+    parser.add_argument("--discount", type=float, default=0.5, help="Absolute discount used by katz backoff, in [0, 1)")
+    parser.add_argument("--show", type=int, default=3, help="Number of generated sequences to print")
+    parser.add_argument("--benchmark", action="store_true", help="Compare with a naive random.choice generator (char level)")
+    return parser
+
+if __name__ == "__main__":
+    main()
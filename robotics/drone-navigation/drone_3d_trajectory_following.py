@@ -5,8 +5,11 @@
 Simulate a quadrotor following a 3D trajectory
 """
 
-from math import cos, sin
+import argparse
 import numpy as np
+
+from math import cos, sin
+from time import time
 from Quadrotor import Quadrotor
 from TrajectoryGenerator import TrajectoryGenerator
 from mpl_toolkits.mplot3d import Axes3D
@@ -89,6 +92,166 @@ def quad_sim(x_c, y_c, z_c):
 
     print("Done")
 
+def segment_times(T, dt):
+    """
+    Returns the times at which quad_sim steps through each trajectory segment
+    (accumulating dt the same way it does, so that the number of steps matches).
+    """
+    times = []
+    t = 0
+    while t <= T:
+        times.append(t)
+        t += dt
+    return np.array(times)
+
+def simulate(x_c, y_c, z_c, start=(-5, -5, 5), dt=0.1, n_run=8):
+    """
+    Headless version of quad_sim: runs the same controller and dynamics without
+    any plotting and returns the whole flight as arrays.
+
+    Instead of building a rotation_matrix every step, only its last column is
+    needed to rotate the thrust vector (0, 0, thrust), so it's written out in
+    closed form (keeping rotation_matrix's cos(pitch) * cos(yaw) term).
+
+    Returns
+        Dict of (n_run * steps_per_segment + 1,) arrays with the time 't' and the
+        'x', 'y', 'z', 'roll', 'pitch' and 'yaw' of the quadrotor at each step
+        (the first entry being its initial state).
+    """
+    times = segment_times(T, dt)
+    n_steps = n_run * len(times) + 1
+    history = {key: np.empty(n_steps) for key in ('t', 'x', 'y', 'z', 'roll', 'pitch', 'yaw')}
+
+    x_pos, y_pos, z_pos = start
+    x_vel    =  y_vel     = z_vel   = 0
+    roll     =  pitch     = yaw     = 0
+    roll_vel =  pitch_vel = yaw_vel = 0
+    des_yaw = 0
+    sin_des_yaw, cos_des_yaw = sin(des_yaw), cos(des_yaw)
+
+    step = 0
+    history['t'][0] = 0
+    for key, value in zip(('x', 'y', 'z', 'roll', 'pitch', 'yaw'), (x_pos, y_pos, z_pos, roll, pitch, yaw)):
+        history[key][0] = value
+
+    for irun in range(n_run):
+        i = irun % 4
+        # desired values for the whole segment at once
+        des_z_pos = calculate(z_c[i], times, value='position').tolist()
+        des_z_vel = calculate(z_c[i], times, value='velocity').tolist()
+        des_x_acc = calculate(x_c[i], times, value='acceleration').tolist()
+        des_y_acc = calculate(y_c[i], times, value='acceleration').tolist()
+        des_z_acc = calculate(z_c[i], times, value='acceleration').tolist()
+
+        for k in range(len(times)):
+            thrust = m * (g + des_z_acc[k] + Kp_z * (des_z_pos[k] - z_pos) + Kd_z * (des_z_vel[k] - z_vel))
+
+            roll_torque  = Kp_roll  * (((des_x_acc[k] * sin_des_yaw - des_y_acc[k] * cos_des_yaw) / g) - roll)
+            pitch_torque = Kp_pitch * (((des_x_acc[k] * cos_des_yaw - des_y_acc[k] * sin_des_yaw) / g) - pitch)
+            yaw_torque   = Kp_yaw   * (des_yaw - yaw)
+
+            roll_vel  += roll_torque  * dt / Ixx
+            pitch_vel += pitch_torque * dt / Iyy
+            yaw_vel   += yaw_torque   * dt / Izz
+
+            roll  += roll_vel  * dt
+            pitch += pitch_vel * dt
+            yaw   += yaw_vel   * dt
+
+            # R @ (0, 0, thrust), i.e. thrust times the last column of rotation_matrix(roll, pitch, yaw)
+            cos_roll, sin_roll = cos(roll), sin(roll)
+            cos_pitch, sin_pitch = cos(pitch), sin(pitch)
+            cos_yaw, sin_yaw = cos(yaw), sin(yaw)
+            x_acc = (sin_yaw * sin_roll + cos_yaw * sin_pitch * cos_roll) * thrust / m
+            y_acc = (-cos_yaw * sin_roll + sin_yaw * sin_pitch * cos_roll) * thrust / m
+            z_acc = (cos_pitch * cos_yaw * thrust - m * g) / m
+            x_vel += x_acc * dt; y_vel += y_acc * dt; z_vel += z_acc * dt
+            x_pos += x_vel * dt; y_pos += y_vel * dt; z_pos += z_vel * dt
+
+            step += 1
+            history['t'][step] = history['t'][step - 1] + dt
+            history['x'][step] = x_pos; history['y'][step] = y_pos; history['z'][step] = z_pos
+            history['roll'][step] = roll; history['pitch'][step] = pitch; history['yaw'][step] = yaw
+
+    return history
+
+def simulate_batch(x_c, y_c, z_c, starts, dt=0.1, n_run=8):
+    """
+    Simulates many flights at once, vectorizing simulate over them.
+
+    Args
+        x_c, y_c, z_c: (n_flights, 4, 6) arrays with each flight's segment coefficients.
+        starts: (n_flights, 3) array with each flight's initial position.
+
+    Returns
+        Dict of (n_flights, n_steps) arrays (and the (n_steps,) time 't'), as simulate's.
+    """
+    x_c, y_c, z_c = np.asarray(x_c), np.asarray(y_c), np.asarray(z_c)
+    starts = np.asarray(starts, dtype=np.float64)
+    n_flights = len(starts)
+    times = segment_times(T, dt)
+    n_steps = n_run * len(times) + 1
+    history = {key: np.empty((n_flights, n_steps)) for key in ('x', 'y', 'z', 'roll', 'pitch', 'yaw')}
+    history['t'] = np.concatenate([[0], np.cumsum(np.full(n_steps - 1, dt))])
+
+    x_pos, y_pos, z_pos = starts[:, 0].copy(), starts[:, 1].copy(), starts[:, 2].copy()
+    x_vel, y_vel, z_vel = np.zeros(n_flights), np.zeros(n_flights), np.zeros(n_flights)
+    roll, pitch, yaw = np.zeros(n_flights), np.zeros(n_flights), np.zeros(n_flights)
+    roll_vel, pitch_vel, yaw_vel = np.zeros(n_flights), np.zeros(n_flights), np.zeros(n_flights)
+    des_yaw = 0
+    sin_des_yaw, cos_des_yaw = sin(des_yaw), cos(des_yaw)
+
+    step = 0
+    for key, value in zip(('x', 'y', 'z', 'roll', 'pitch', 'yaw'), (x_pos, y_pos, z_pos, roll, pitch, yaw)):
+        history[key][:, 0] = value
+
+    for irun in range(n_run):
+        i = irun % 4
+        # (6, n_flights, 1) coefficients, so that the desired values are (n_flights, steps_per_segment)
+        coeffs = lambda c: np.moveaxis(c[:, i, :], 1, 0)[..., None]
+        des_z_pos = calculate(coeffs(z_c), times, value='position')
+        des_z_vel = calculate(coeffs(z_c), times, value='velocity')
+        des_x_acc = calculate(coeffs(x_c), times, value='acceleration')
+        des_y_acc = calculate(coeffs(y_c), times, value='acceleration')
+        des_z_acc = calculate(coeffs(z_c), times, value='acceleration')
+
+        for k in range(len(times)):
+            thrust = m * (g + des_z_acc[:, k] + Kp_z * (des_z_pos[:, k] - z_pos) + Kd_z * (des_z_vel[:, k] - z_vel))
+
+            roll_vel  += Kp_roll  * (((des_x_acc[:, k] * sin_des_yaw - des_y_acc[:, k] * cos_des_yaw) / g) - roll) * dt / Ixx
+            pitch_vel += Kp_pitch * (((des_x_acc[:, k] * cos_des_yaw - des_y_acc[:, k] * sin_des_yaw) / g) - pitch) * dt / Iyy
+            yaw_vel   += Kp_yaw   * (des_yaw - yaw) * dt / Izz
+
+            roll  += roll_vel  * dt
+            pitch += pitch_vel * dt
+            yaw   += yaw_vel   * dt
+
+            cos_roll, sin_roll = np.cos(roll), np.sin(roll)
+            cos_pitch, sin_pitch = np.cos(pitch), np.sin(pitch)
+            cos_yaw, sin_yaw = np.cos(yaw), np.sin(yaw)
+            x_vel += (sin_yaw * sin_roll + cos_yaw * sin_pitch * cos_roll) * thrust / m * dt
+            y_vel += (-cos_yaw * sin_roll + sin_yaw * sin_pitch * cos_roll) * thrust / m * dt
+            z_vel += (cos_pitch * cos_yaw * thrust - m * g) / m * dt
+            x_pos += x_vel * dt; y_pos += y_vel * dt; z_pos += z_vel * dt
+
+            step += 1
+            for key, value in zip(('x', 'y', 'z', 'roll', 'pitch', 'yaw'), (x_pos, y_pos, z_pos, roll, pitch, yaw)):
+                history[key][:, step] = value
+
+    return history
+
+def replay(history, every=1, size=1):
+    """
+    Animates a flight returned by simulate, drawing only one of every `every` steps.
+    """
+    keys = ('x', 'y', 'z', 'roll', 'pitch', 'yaw')
+    q = Quadrotor(*(history[key][0] for key in keys), size=size, show_animation=True)
+    try:
+        for step in range(every, len(history['t']), every):
+            q.update_pose(*(history[key][step] for key in keys))
+    except KeyboardInterrupt:
+        pass
+
 def calculate(c, t, value):
     """
     Calculates the position/velocity/acceleration value given a set of quintic coefficients and a time.
@@ -133,7 +296,7 @@ def rotation_matrix(roll, pitch, yaw):
                        cos(pitch) * cos(yaw)]])
 
 
-def main():
+def trajectory_coefficients(waypoints):
     """
     Calculates the x, y, z coefficients for the four segments 
     of the trajectory
@@ -141,7 +304,6 @@ def main():
     x_coeffs  = np.zeros(shape=(4, 6))
     y_coeffs  = np.zeros(shape=(4, 6))
     z_coeffs  = np.zeros(shape=(4, 6))
-    waypoints = [[-5, -5, 5], [5, -5, 5], [5, 5, 5], [-5, 5, 5]]
 
     for i in range(4):
         traj = TrajectoryGenerator(waypoints[i], waypoints[(i + 1) % 4], T)
@@ -149,8 +311,36 @@ def main():
         x_coeffs[i] = traj.x_c.ravel()
         y_coeffs[i] = traj.y_c.ravel()
         z_coeffs[i] = traj.z_c.ravel()
+    return x_coeffs, y_coeffs, z_coeffs
+
+def main():
+    args = get_parser().parse_args()
+    waypoints = [[-5, -5, 5], [5, -5, 5], [5, 5, 5], [-5, 5, 5]]
+    x_coeffs, y_coeffs, z_coeffs = trajectory_coefficients(waypoints)
+
+    if args.flights:
+        # the same trajectory from randomly perturbed starting positions
+        starts = np.array(waypoints[0]) + np.random.default_rng(0).normal(scale=0.5, size=(args.flights, 3))
+        tile = lambda c: np.broadcast_to(c, (args.flights, *c.shape))
+        start = time()
+        history = simulate_batch(tile(x_coeffs), tile(y_coeffs), tile(z_coeffs), starts)
+        print(f"Simulated {args.flights} flights of {history['x'].shape[1]} steps in {time() - start:.3f}s")
+    elif args.headless or args.every:
+        start = time()
+        history = simulate(x_coeffs, y_coeffs, z_coeffs, start=waypoints[0])
+        print(f"Simulated {len(history['t'])} steps in {time() - start:.4f}s, "
+              f"final position = ({history['x'][-1]:.3f}, {history['y'][-1]:.3f}, {history['z'][-1]:.3f})")
+        if args.every:
+            replay(history, every=args.every)
+    else:
+        quad_sim(x_coeffs, y_coeffs, z_coeffs)
 
-    quad_sim(x_coeffs, y_coeffs, z_coeffs)
+def get_parser():
+    parser = argparse.ArgumentParser(description="Simulate a quadrotor following a 3D trajectory")
+    parser.add_argument("--headless", action="store_true", help="Simulate without animating every step")
+    parser.add_argument("--every", type=int, default=None, help="Simulate headlessly, then replay one of every EVERY steps")
+    parser.add_argument("--flights", type=int, default=None, help="Simulate this many flights at once (headless)")
+    return parser
 
 
 if __name__ == "__main__":
@@ -0,0 +1,194 @@
+'''Vector space search index supporting incremental document additions, removals and updates'''
+
+import heapq
+import threading
+
+from operator import itemgetter
+from vector_space_search import VectorCompare, InvertedIndex
+
+class IncrementalIndex:
+    '''
+    Keeps the documents in a list of InvertedIndex segments: new documents go into the last (open) segment,
+    removed ones are only tombstoned, and sealed segments are periodically merged back into a single one
+    (dropping the tombstoned documents). Collection statistics (document frequencies, lengths) are kept
+    up to date on every change, so results are the same as the ones of an index rebuilt from scratch
+    '''
+    def __init__(self, k1=1.2, b=0.75, segment_size=10_000, max_segments=8, max_deleted_ratio=0.3):
+        self.vector = VectorCompare()
+        self.k1 = k1
+        self.b = b
+        self.segment_size = segment_size           # number of documents after which the open segment is sealed
+        self.max_segments = max_segments           # number of sealed segments that triggers a merge
+        self.max_deleted_ratio = max_deleted_ratio # ratio of tombstoned documents that triggers a merge
+
+        self.segments = [InvertedIndex(k1, b)]
+        self.deleted = {self.segments[0]: set()} # segment -> tombstoned doc indices
+        self.locations = {}                      # doc_id -> (segment, doc_index, terms) of its live version
+        self.df = {}                             # term -> number of live documents containing it
+        self.total_length = 0
+
+        self.lock = threading.RLock()
+        self.merging = threading.Lock() # only one merge runs at a time
+        self.merger = None # background merging (thread, stop event)
+        self.listeners = [] # called with no arguments whenever the live documents change (e.g. to invalidate caches)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.locations
+
+    # same collection statistics as InvertedIndex, but computed over the live documents of all segments
+    idf = InvertedIndex.idf
+
+    def document_frequency(self, term):
+        return self.df.get(term, 0)
+
+    def average_length(self):
+        return self.total_length / len(self) if len(self) != 0 else 0
+
+    def notify(self):
+        for listener in self.listeners:
+            listener()
+
+    def add(self, doc_id, text):
+        with self.lock:
+            sealed = self._add(doc_id, text)
+        self.notify()
+        # merges without holding the lock, as merge takes self.merging before it (the opposite order could deadlock)
+        if sealed and self.merger is None:
+            self.maybe_merge()
+
+    def _add(self, doc_id, text):
+        # returns whether the last segment got full (and was sealed), must be called holding the lock
+        if doc_id in self.locations:
+            raise KeyError(f"Document {doc_id!r} is already indexed (use update instead)")
+        segment = self.segments[-1]
+        concordance = segment.concordance(text)
+        doc_index = segment.add(doc_id, concordance)
+        self.locations[doc_id] = (segment, doc_index, tuple(concordance))
+        for term in concordance:
+            self.df[term] = self.df.get(term, 0) + 1
+        self.total_length += segment.lengths[doc_index]
+
+        if len(segment) >= self.segment_size:
+            self.segments.append(InvertedIndex(self.k1, self.b))
+            self.deleted[self.segments[-1]] = set()
+            return True
+        return False
+
+    def remove(self, doc_id):
+        with self.lock:
+            segment, doc_index, terms = self.locations.pop(doc_id)
+            self.deleted[segment].add(doc_index)
+            for term in terms:
+                self.df[term] -= 1
+                if self.df[term] == 0:
+                    del self.df[term]
+            self.total_length -= segment.lengths[doc_index]
+        self.notify()
+
+    def update(self, doc_id, text):
+        with self.lock:
+            self.remove(doc_id)
+            sealed = self._add(doc_id, text)
+        self.notify()
+        # merges without holding the lock, as merge takes self.merging before it (the opposite order could deadlock)
+        if sealed and self.merger is None:
+            self.maybe_merge()
+
+    def scores(self, query, scoring='cosine'):
+        '''
+        Returns a {(segment, doc_index): score} dict with the live documents that share at least one term with the query
+        '''
+        query = query if isinstance(query, dict) else self.vector.concordance(query)
+        with self.lock:
+            scores = {}
+            for segment in self.segments:
+                for doc_index, score in segment.accumulate(query, scoring, stats=self, deleted=self.deleted[segment]).items():
+                    scores[(segment, doc_index)] = score
+            return scores
+
+    def search(self, query, k=10, scoring='cosine'):
+        '''
+        Returns the k best (score, doc_id) matches in decreasing score order (or all of them if k is None)
+        '''
+        scores = self.scores(query, scoring)
+        if k is None:
+            k = len(scores)
+        top = heapq.nlargest(k, scores.items(), key=itemgetter(1))
+        return [(score, segment.doc_ids[doc_index]) for (segment, doc_index), score in top]
+
+    # __________________________________________________________________________
+
+    def maybe_merge(self):
+        # merges the sealed segments if there are too many of them, or if too many of their documents were removed
+        with self.lock:
+            sealed = self.segments[:-1]
+            n_docs = sum(len(segment) for segment in sealed)
+            n_deleted = sum(len(self.deleted[segment]) for segment in sealed)
+            should_merge = len(sealed) >= self.max_segments or (n_docs != 0 and n_deleted / n_docs > self.max_deleted_ratio)
+        if should_merge:
+            self.merge()
+
+    def merge(self):
+        '''
+        Merges all sealed segments into a single one, dropping their tombstoned documents
+        Note: the new segment is built without holding the lock, so searches (and changes) can proceed meanwhile
+        '''
+        with self.merging:
+            self._merge()
+
+    def _merge(self):
+        with self.lock:
+            sealed = self.segments[:-1]
+            if len(sealed) == 0 or (len(sealed) == 1 and len(self.deleted[sealed[0]]) == 0):
+                return
+            deleted = {segment: set(self.deleted[segment]) for segment in sealed}
+
+        merged = InvertedIndex(self.k1, self.b)
+        remap = {} # (segment, old doc_index) -> new doc_index
+        for segment in sealed:
+            for doc_index, doc_id in enumerate(segment.doc_ids):
+                if doc_index not in deleted[segment]:
+                    remap[(segment, doc_index)] = len(merged.doc_ids)
+                    merged.doc_ids.append(doc_id)
+                    merged.norms.append(segment.norms[doc_index])
+                    merged.lengths.append(segment.lengths[doc_index])
+                    merged.total_length += segment.lengths[doc_index]
+            for term, postings in segment.postings.items():
+                new_postings = [(remap[(segment, doc_index)], count)
+                                for doc_index, count in postings if doc_index not in deleted[segment]]
+                if len(new_postings) != 0:
+                    merged.postings.setdefault(term, []).extend(new_postings)
+
+        with self.lock:
+            self.deleted[merged] = set()
+            for doc_id, (segment, doc_index, terms) in self.locations.items():
+                if segment in deleted:
+                    self.locations[doc_id] = (merged, remap[(segment, doc_index)], terms)
+            # documents removed while merging were tombstoned on the old segments
+            for segment in sealed:
+                for doc_index in self.deleted.pop(segment) - deleted[segment]:
+                    self.deleted[merged].add(remap[(segment, doc_index)])
+            self.segments = [merged] + self.segments[len(sealed):]
+
+    def start_merging(self, interval=1.0):
+        '''
+        Starts a background thread that checks whether the sealed segments should be merged every interval seconds
+        '''
+        if self.merger is not None:
+            return
+        stop = threading.Event()
+        def run():
+            while not stop.wait(interval):
+                self.maybe_merge()
+        self.merger = (threading.Thread(target=run, daemon=True), stop)
+        self.merger[0].start()
+
+    def stop_merging(self):
+        if self.merger is not None:
+            thread, stop = self.merger
+            stop.set()
+            thread.join()
+            self.merger = None
@@ -0,0 +1,231 @@
+'''Persistent, memory-mapped on-disk format for the vector space search inverted index'''
+
+import json
+import mmap
+import heapq
+import struct
+import argparse
+import numpy as np
+
+from operator import itemgetter
+from indexer import concordance, index_files
+from vector_space_search import VectorCompare, InvertedIndex, SCORINGS
+
+MAGIC = b'VSSI'
+VERSION = 1
+
+# file layout (little-endian, every section starts at an 8 byte aligned offset):
+#   header   : magic, version, n_docs, n_terms, n_postings, k1, b, total_length
+#   sections : (offset, size) of each of the SECTIONS below, in order
+SECTIONS = (
+    ('term_offsets',    np.uint64),  # (n_terms + 1,) offsets into term_blob
+    ('term_blob',       np.uint8),   # utf-8 encoded terms, sorted by their bytes
+    ('posting_offsets', np.uint64),  # (n_terms + 1,) offsets into posting_docs / posting_counts
+    ('posting_docs',    np.uint32),  # (n_postings,) doc indices, grouped by term
+    ('posting_counts',  np.uint32),  # (n_postings,) term counts, grouped by term
+    ('norms',           np.float64), # (n_docs,) magnitude of each document's concordance
+    ('lengths',         np.uint32),  # (n_docs,) number of terms in each document
+    ('doc_id_offsets',  np.uint64),  # (n_docs + 1,) offsets into doc_id_blob
+    ('doc_id_blob',     np.uint8),   # json encoded doc ids
+)
+HEADER = struct.Struct('<4sIQQQddQ')
+SECTION = struct.Struct('<QQ')
+
+def _blob(items):
+    encoded = [item.encode('utf-8') for item in items]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+def write_index(fname, index):
+    '''
+    Writes an InvertedIndex to fname, so that it can later be opened (and shared between processes) with MappedIndex
+    '''
+    terms = sorted(index.postings, key=lambda term: term.encode('utf-8'))
+    term_offsets, term_blob = _blob(terms)
+
+    posting_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+    np.cumsum([len(index.postings[term]) for term in terms], out=posting_offsets[1:])
+    posting_docs = np.empty(int(posting_offsets[-1]), dtype=np.uint32)
+    posting_counts = np.empty(int(posting_offsets[-1]), dtype=np.uint32)
+    for term, start, end in zip(terms, posting_offsets[:-1].tolist(), posting_offsets[1:].tolist()):
+        posting_docs[start:end], posting_counts[start:end] = zip(*index.postings[term])
+
+    doc_id_offsets, doc_id_blob = _blob(json.dumps(doc_id) for doc_id in index.doc_ids)
+
+    arrays = {
+        'term_offsets': term_offsets, 'term_blob': term_blob,
+        'posting_offsets': posting_offsets, 'posting_docs': posting_docs, 'posting_counts': posting_counts,
+        'norms': np.asarray(index.norms, dtype=np.float64), 'lengths': np.asarray(index.lengths, dtype=np.uint32),
+        'doc_id_offsets': doc_id_offsets, 'doc_id_blob': doc_id_blob,
+    }
+
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    layout = []
+    for name, dtype in SECTIONS:
+        offset += -offset % 8
+        size = arrays[name].astype(dtype, copy=False).nbytes
+        layout.append((offset, size))
+        offset += size
+
+    with open(fname, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(index), len(terms), len(posting_docs),
+                            index.k1, index.b, index.total_length))
+        for section in layout:
+            f.write(SECTION.pack(*section))
+        for (name, dtype), (offset, _) in zip(SECTIONS, layout):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(arrays[name].astype(dtype, copy=False).tobytes())
+
+class MappedIndex:
+    '''
+    Read-only index backed by a memory-mapped file written by write_index
+    Note: the arrays are views over the mapped pages, so opening is (almost) instant and
+          the OS page cache is shared by every process that opens the same file
+    '''
+    def __init__(self, fname):
+        self.vector = VectorCompare()
+        with open(fname, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.n_docs, self.n_terms, self.n_postings, self.k1, self.b, self.total_length = \
+            HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"'{fname}' is not a vector space search index file")
+        if version != VERSION:
+            raise ValueError(f"'{fname}' has index format version {version}, expected {VERSION}")
+
+        for i, (name, dtype) in enumerate(SECTIONS):
+            offset, size = SECTION.unpack_from(self.mmap, HEADER.size + i * SECTION.size)
+            setattr(self, name, np.frombuffer(self.mmap, dtype=dtype, count=size // np.dtype(dtype).itemsize, offset=offset))
+
+    def __len__(self):
+        return self.n_docs
+
+    # same collection statistics as the in-memory index
+    idf = InvertedIndex.idf
+    average_length = InvertedIndex.average_length
+
+    def close(self):
+        # the section arrays are views over the mapping, which can't be closed while they (or slices of them) exist
+        if self.mmap.closed:
+            return
+        for name, _ in SECTIONS:
+            delattr(self, name)
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def term(self, i):
+        return bytes(self.term_blob[self.term_offsets[i]:self.term_offsets[i + 1]])
+
+    def find(self, term):
+        # binary search over the sorted term dictionary, returns the term index or None
+        key = term.encode('utf-8')
+        low, high = 0, self.n_terms
+        while low < high:
+            mid = (low + high) // 2
+            if self.term(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low if low < self.n_terms and self.term(low) == key else None
+
+    def postings(self, term):
+        i = self.find(term)
+        if i is None:
+            return self.posting_docs[:0], self.posting_counts[:0]
+        start, end = self.posting_offsets[i], self.posting_offsets[i + 1]
+        return self.posting_docs[start:end], self.posting_counts[start:end]
+
+    def document_frequency(self, term):
+        return len(self.postings(term)[0])
+
+    def doc_id(self, doc_index):
+        return json.loads(bytes(self.doc_id_blob[self.doc_id_offsets[doc_index]:self.doc_id_offsets[doc_index + 1]]))
+
+    def scores(self, query, scoring='cosine'):
+        '''
+        Returns the (doc_indices, scores) arrays of the documents that share at least one term with the query,
+        computed the same way as InvertedIndex.scores (i.e. the 'cosine' score matches VectorCompare.relation)
+        '''
+        if scoring not in SCORINGS:
+            raise ValueError(f"Unknown scoring '{scoring}', expected one of {SCORINGS}")
+        concordance = query if isinstance(query, dict) else self.vector.concordance(query)
+        query_norm = self.vector.magnitude(concordance)
+
+        docs, weights = [], []
+        for term, query_count in concordance.items():
+            term_docs, term_counts = self.postings(term)
+            if len(term_docs) == 0:
+                continue
+            counts = term_counts.astype(np.float64)
+            if scoring == 'bm25':
+                lengths = self.lengths[term_docs]
+                counts = counts * (self.k1 + 1) / (counts + self.k1 * (1 - self.b + self.b * lengths / self.average_length()))
+            docs.append(term_docs)
+            weights.append(counts * (query_count if scoring == 'cosine' else query_count * self.idf(term, scoring)))
+        if len(docs) == 0 or query_norm == 0:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0)
+
+        # sums the weights of each document (scaling with the number of postings, not with the number of documents)
+        doc_indices, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        if scoring == 'cosine':
+            scores /= query_norm * self.norms[doc_indices]
+        elif scoring == 'tfidf':
+            scores /= self.norms[doc_indices]
+        return doc_indices, scores
+
+    def search(self, query, k=10, scoring='cosine'):
+        '''
+        Returns the k best (score, doc_id) matches in decreasing score order (or all of them if k is None)
+        '''
+        doc_indices, scores = self.scores(query, scoring)
+        if k is None:
+            k = len(scores)
+        top = heapq.nlargest(k, zip(doc_indices.tolist(), scores.tolist()), key=itemgetter(1))
+        return [(score, self.doc_id(doc_index)) for doc_index, score in top]
+
+# ______________________________________________________________________________
+
+def build(args):
+    index = index_files(args.inputs, processes=args.processes, k1=args.k1, b=args.b)
+    write_index(args.index, index)
+    print(f"Indexed {len(index)} documents ({len(index.postings)} terms) into {args.index}")
+
+def query(args):
+    with MappedIndex(args.index) as index:
+        for score, doc_id in index.search(concordance([' '.join(args.terms)]), k=args.k, scoring=args.scoring):
+            print(f"{score:.6f} {doc_id}")
+
+def main():
+    args = get_parser().parse_args()
+    args.func(args)
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Build and query memory-mapped vector space search index files")
+    subparsers = parser.add_subparsers(required=True)
+
+    build_parser = subparsers.add_parser("build", help="Index text files (one document per file) into an index file")
+    build_parser.add_argument("index", help="Output index file")
+    build_parser.add_argument("inputs", nargs="+", help="Text files or directories to index")
+    build_parser.add_argument("--k1", type=float, default=1.2, help="BM25 term frequency saturation")
+    build_parser.add_argument("--b", type=float, default=0.75, help="BM25 document length normalization")
+    build_parser.add_argument("--processes", "-j", type=int, default=None, help="Number of indexing processes (defaults to the CPU count)")
+    build_parser.set_defaults(func=build)
+
+    query_parser = subparsers.add_parser("query", help="Search an index file")
+    query_parser.add_argument("index", help="Index file built with the 'build' command")
+    query_parser.add_argument("terms", nargs="+", help="Search terms")
+    query_parser.add_argument("-k", type=int, default=10, help="Number of results to show")
+    query_parser.add_argument("--scoring", choices=SCORINGS, default="cosine", help="Scoring function")
+    query_parser.set_defaults(func=query)
+    return parser
+
+if __name__ == "__main__":
+    main()
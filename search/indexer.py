@@ -0,0 +1,92 @@
+'''Streaming tokenization and multi-process indexing of large text corpora'''
+
+import os
+import re
+
+from functools import partial
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from vector_space_search import InvertedIndex
+
+TOKEN = re.compile(r"\w+(?:'\w+)*") # words, keeping contractions (e.g. "don't") together
+TAIL = re.compile(r"[^\w'][\w']*\Z") # the last character that can't be part of a token, and what follows it
+CHUNK_SIZE = 1 << 20 # characters read at a time
+
+def read_chunks(fname, chunk_size=CHUNK_SIZE):
+    with open(fname, encoding='utf-8', errors='replace') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def tokenize(chunks, lowercase=True):
+    '''
+    Yields the tokens of a stream of text chunks (e.g. a file's read_chunks, or any iterable of str),
+    dropping punctuation and whitespace runs, so that the whole text never needs to be in memory
+    Note: a token split between two chunks is only yielded once the next chunk is read
+    '''
+    carry = ''
+    for chunk in chunks:
+        chunk = carry + chunk
+        carry = ''
+        if not chunk:
+            continue
+        # the last word may continue on the next chunk, so it's held back (cutting after punctuation too,
+        # not only whitespace, as otherwise text such as "a,b,c,..." would be carried over whole)
+        tail = TAIL.search(chunk)
+        cut = tail.start() + 1 if tail is not None else 0
+        chunk, carry = chunk[:cut], chunk[cut:]
+        yield from TOKEN.findall(chunk.lower() if lowercase else chunk)
+    if carry:
+        yield from TOKEN.findall(carry.lower() if lowercase else carry)
+
+def concordance(chunks, lowercase=True):
+    # same {word: count} dict as VectorCompare.concordance, but built from a token stream
+    return dict(Counter(tokenize(chunks, lowercase)))
+
+def list_files(paths):
+    # expands directories (recursively) into the files they contain
+    fnames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                fnames.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            fnames.append(path)
+    return fnames
+
+def index_shard(fnames, chunk_size=CHUNK_SIZE, k1=1.2, b=0.75):
+    # builds the partial index of a shard of files (one document per file, identified by its file name)
+    index = InvertedIndex(k1, b)
+    for fname in fnames:
+        index.add(fname, concordance(read_chunks(fname, chunk_size)))
+    return index
+
+def shard(fnames, n_shards):
+    # splits the files into n_shards groups of similar total size (greedily, from the largest file)
+    shards = [[] for _ in range(n_shards)]
+    sizes = [0] * n_shards
+    for fname in sorted(fnames, key=os.path.getsize, reverse=True):
+        i = sizes.index(min(sizes))
+        shards[i].append(fname)
+        sizes[i] += os.path.getsize(fname)
+    return [sorted(fnames) for fnames in shards if len(fnames) != 0]
+
+def index_files(paths, processes=None, chunk_size=CHUNK_SIZE, k1=1.2, b=0.75):
+    '''
+    Indexes every file in paths into a single InvertedIndex, sharding the files over a pool of processes
+    (defaults to one per CPU) and then merging the partial indexes built by each of them
+    '''
+    fnames = list_files(paths)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(fnames) <= 1:
+        return index_shard(fnames, chunk_size, k1, b)
+
+    index = InvertedIndex(k1, b)
+
+    shards = shard(fnames, processes * 4) # more shards than processes, to balance uneven files
+    with ProcessPoolExecutor(processes) as executor:
+        for shard_index in executor.map(partial(index_shard, chunk_size=chunk_size, k1=k1, b=b), shards):
+            index.extend(shard_index)
+    return index
@@ -0,0 +1,101 @@
+'''Bounded query result cache for the vector space search indexes'''
+
+import threading
+
+from time import monotonic
+from collections import OrderedDict
+
+class QueryCache:
+    '''
+    Least recently used cache with an optional time to live (in seconds) for its entries
+    Note: clear() starts a new "generation", so that results computed before an invalidation are never stored
+    '''
+    def __init__(self, maxsize=4096, ttl=None, clock=monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict() # key -> (expiration time, value), from least to most recently used
+        self.generation = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0     # entries dropped to respect maxsize
+        self.expirations = 0   # entries dropped for being older than ttl
+        self.invalidations = 0 # calls to clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                expiration, value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expiration is not None and self.clock() >= expiration:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return # the index changed while the value was being computed
+            self.entries[key] = (self.clock() + self.ttl if self.ttl is not None else None, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries), 'maxsize': self.maxsize,
+            'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups != 0 else 0,
+            'evictions': self.evictions, 'expirations': self.expirations, 'invalidations': self.invalidations,
+        }
+
+class CachedIndex:
+    '''
+    Wraps an InvertedIndex or IncrementalIndex (or MappedIndex, which never changes), caching search results
+    by the query's concordance, so that "b a" and "a b" share the same entry, and invalidating them whenever
+    documents are added, removed or updated
+    '''
+    def __init__(self, index, maxsize=4096, ttl=None):
+        self.index = index
+        self.cache = QueryCache(maxsize, ttl)
+        if hasattr(index, 'listeners'):
+            index.listeners.append(self.cache.clear)
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        # stops receiving the index's invalidations
+        if hasattr(self.index, 'listeners'):
+            self.index.listeners.remove(self.cache.clear)
+
+    def search(self, query, k=10, scoring='cosine'):
+        concordance = query if isinstance(query, dict) else self.index.vector.concordance(query)
+        key = (frozenset(concordance.items()), k, scoring)
+        results = self.cache.get(key)
+        if results is None:
+            generation = self.cache.generation
+            results = tuple(self.index.search(concordance, k, scoring))
+            self.cache.put(key, results, generation)
+        return list(results)
+
+    def stats(self):
+        return self.cache.stats()
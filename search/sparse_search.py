@@ -0,0 +1,99 @@
+'''Batched vector space search with the corpus stored as a sparse (CSR) document-term matrix'''
+
+import numpy as np
+from scipy import sparse
+
+from vector_space_search import VectorCompare
+
+class SparseIndex:
+    '''
+    Vectorized counterpart of VectorCompare.relation: queries are answered in batches with a single
+    sparse matrix product against the corpus, while VectorCompare remains the scalar reference implementation
+    '''
+    def __init__(self, documents=None):
+        self.vector = VectorCompare()
+        self.vocabulary = {} # term -> column index (shared by the corpus and the queries)
+        self.doc_ids = []    # row index -> doc_id
+        self.matrix = sparse.csr_matrix((0, 0)) # (n_docs, n_terms) term counts
+        self.norms = np.zeros(0)                # (n_docs,) magnitude of each row
+        if documents is not None:
+            self.fit(documents)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def concordance(self, document):
+        return document if isinstance(document, dict) else self.vector.concordance(document)
+
+    def fit(self, documents):
+        '''
+        Builds the vocabulary and the document-term matrix from a {doc_id: document} dict,
+        where each document is either raw text or an already built concordance
+        '''
+        self.vocabulary = {}
+        self.doc_ids = []
+        indptr, indices, data = [0], [], []
+        for doc_id, document in documents.items():
+            for term, count in self.concordance(document).items():
+                indices.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                data.append(count)
+            indptr.append(len(indices))
+            self.doc_ids.append(doc_id)
+
+        self.matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(self.doc_ids), len(self.vocabulary)))
+        self.norms = np.sqrt(np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel())
+        return self
+
+    def query_matrix(self, queries):
+        '''
+        Returns the (n_queries, n_terms) count matrix for the queries and their magnitudes
+        Note: out-of-vocabulary terms can't match any document, but they still count towards the query magnitude
+        '''
+        indptr, indices, data = [0], [], []
+        query_norms = np.zeros(len(queries))
+        for i, query in enumerate(queries):
+            concordance = self.concordance(query)
+            query_norms[i] = self.vector.magnitude(concordance)
+            for term, count in concordance.items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    indices.append(column)
+                    data.append(count)
+            indptr.append(len(indices))
+
+        matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(queries), len(self.vocabulary)))
+        return matrix, query_norms
+
+    def relations(self, queries):
+        '''
+        Returns a sparse (n_queries, n_docs) matrix with the cosine similarity between each query and document,
+        i.e. the same value as VectorCompare.relation (up to floating point rounding), for all pairs at once
+        '''
+        query_matrix, query_norms = self.query_matrix(queries)
+        scores = (query_matrix @ self.matrix.T).tocsr()
+
+        # divides each stored value by the norms of its query (row) and document (column)
+        rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+        scores.data /= query_norms[rows] * self.norms[scores.indices]
+        return scores
+
+    def search(self, queries, k=10):
+        '''
+        Returns, for each query, a list with its k best (score, doc_id) matches in decreasing score order
+        '''
+        scores = self.relations(queries)
+        rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+
+        # sorts the stored values by (row, decreasing score) and keeps the first k of each row
+        order = np.lexsort((-scores.data, rows))
+        rank = np.arange(len(order)) - scores.indptr[rows[order]]
+        top = order[rank < k] if k is not None else order
+
+        results = [[] for _ in range(scores.shape[0])]
+        for row, column, score in zip(rows[top].tolist(), scores.indices[top].tolist(), scores.data[top].tolist()):
+            results[row].append((score, self.doc_ids[column]))
+        return results
@@ -1,5 +1,11 @@
 # ref.: https://boyter.org/2010/08/build-vector-space-search-engine-python/
 
+import heapq
+from math import log
+from operator import itemgetter
+
+SCORINGS = ('cosine', 'tfidf', 'bm25')
+
 class VectorCompare:
     def magnitude(self, concordance):
         assert isinstance(concordance, dict), "Supplied argument should be of type 'dict'"
@@ -24,6 +30,133 @@ class VectorCompare:
                 con[word] = 1
         return con
 
+class InvertedIndex:
+    '''
+    Maps each term to a postings list of (document index, count) pairs, so that a query
+    only touches the documents that share at least one term with it (instead of all of them)
+    '''
+    def __init__(self, k1=1.2, b=0.75):
+        self.vector = VectorCompare()
+        self.k1 = k1 # BM25 term frequency saturation
+        self.b = b   # BM25 document length normalization
+
+        self.postings = {} # term -> [(doc_index, count), ...]
+        self.doc_ids = []  # doc_index -> doc_id
+        self.norms = []    # doc_index -> magnitude of the document's concordance (computed once)
+        self.lengths = []  # doc_index -> number of terms in the document
+        self.total_length = 0
+
+        self.listeners = [] # called with no arguments whenever documents are added (e.g. to invalidate caches)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def concordance(self, document):
+        # documents (and queries) can be given either as raw text or as an already built concordance
+        return document if isinstance(document, dict) else self.vector.concordance(document)
+
+    def add(self, doc_id, document):
+        concordance = self.concordance(document)
+        doc_index = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.norms.append(self.vector.magnitude(concordance))
+        length = sum(concordance.values())
+        self.lengths.append(length)
+        self.total_length += length
+        for term, count in concordance.items():
+            try:
+                self.postings[term].append((doc_index, count))
+            except KeyError:
+                self.postings[term] = [(doc_index, count)]
+        self.notify()
+        return doc_index
+
+    def extend(self, other):
+        # appends all documents of another index (e.g. one built in parallel over a different shard of the corpus)
+        offset = len(self.doc_ids)
+        self.doc_ids.extend(other.doc_ids)
+        self.norms.extend(other.norms)
+        self.lengths.extend(other.lengths)
+        self.total_length += other.total_length
+        for term, postings in other.postings.items():
+            shifted = [(doc_index + offset, count) for doc_index, count in postings] if offset != 0 else postings
+            try:
+                self.postings[term].extend(shifted)
+            except KeyError:
+                self.postings[term] = list(shifted)
+        self.notify()
+        return self
+
+    def notify(self):
+        for listener in self.listeners:
+            listener()
+
+    def document_frequency(self, term):
+        return len(self.postings.get(term, ()))
+
+    def average_length(self):
+        return self.total_length / len(self) if len(self) != 0 else 0
+
+    def idf(self, term, scoring='tfidf'):
+        n, df = len(self), self.document_frequency(term)
+        if scoring == 'bm25':
+            return log(1 + (n - df + 0.5) / (df + 0.5))
+        return log((1 + n) / (1 + df)) + 1 # smoothed, so that terms present in every document still count
+
+    def scores(self, query, scoring='cosine'):
+        '''
+        Returns a {doc_index: score} dict with the documents that share at least one term with the query,
+        where the 'cosine' score is the same as VectorCompare.relation's
+        '''
+        return self.accumulate(self.concordance(query), scoring, stats=self)
+
+    def accumulate(self, query, scoring, stats, deleted=()):
+        '''
+        Scores this index's postings against the query concordance, reading the collection statistics
+        (number of documents, document frequencies, average length) from stats and skipping deleted doc indices
+        '''
+        if scoring not in SCORINGS:
+            raise ValueError(f"Unknown scoring '{scoring}', expected one of {SCORINGS}")
+
+        if scoring == 'bm25':
+            k1, b, average_length = stats.k1, stats.b, stats.average_length()
+        query_norm = self.vector.magnitude(query)
+        if query_norm == 0:
+            return {}
+
+        scores = {}
+        lengths = self.lengths
+        for term, query_count in query.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            weight = query_count if scoring == 'cosine' else query_count * stats.idf(term, scoring)
+            for doc_index, count in postings:
+                if doc_index in deleted:
+                    continue
+                if scoring == 'bm25':
+                    count = count * (k1 + 1) / (count + k1 * (1 - b + b * lengths[doc_index] / average_length))
+                scores[doc_index] = scores.get(doc_index, 0) + weight * count
+
+        norms = self.norms
+        if scoring == 'cosine':
+            for doc_index in scores:
+                scores[doc_index] /= query_norm * norms[doc_index]
+        elif scoring == 'tfidf':
+            for doc_index in scores:
+                scores[doc_index] /= norms[doc_index]
+        return scores
+
+    def search(self, query, k=10, scoring='cosine'):
+        '''
+        Returns the k best (score, doc_id) matches in decreasing score order (or all of them if k is None)
+        '''
+        scores = self.scores(query, scoring)
+        if k is None:
+            k = len(scores)
+        top = heapq.nlargest(k, scores.items(), key=itemgetter(1))
+        return [(score, self.doc_ids[doc_index]) for doc_index, score in top]
+
 if __name__ == "__main__":
     documents = {
         0: '''At Scale You Will Hit Every Performance Issue I used to think I knew a bit about performance scalability and how to keep things trucking when you hit large amounts of data Truth is I know diddly squat on the subject since the most I have ever done is read about how its done To understand how I came about realising this you need some background''',
@@ -35,26 +168,12 @@ if __name__ == "__main__":
         6: '''Why CAPTCHA Never Use Numbers 0 1 5 7 Interestingly this sort of question pops up a lot in my referring search term stats Why CAPTCHAs never use the numbers 0 1 5 7 Its a relativity simple question with a reasonably simple answer Its because each of the above numbers are easy to confuse with a letter See the below''',
     }
 
-    v = VectorCompare()
-    index = {
-        0: v.concordance(documents[0].lower()),
-        1: v.concordance(documents[1].lower()),
-        2: v.concordance(documents[2].lower()),
-        3: v.concordance(documents[3].lower()),
-        4: v.concordance(documents[4].lower()),
-        5: v.concordance(documents[5].lower()),
-        6: v.concordance(documents[6].lower()),
-    }
+    index = InvertedIndex()
+    for doc_id, document in documents.items():
+        index.add(doc_id, document.lower())
 
     search_term = input('Enter search term: ')
 
-    matches = []
-    for i in range(len(index)):
-        relation = v.relation(v.concordance(search_term.lower()), index[i])
-        if relation != 0:
-            matches.append((relation, documents[i][:100]))
-
-    matches.sort(reverse=True)
-    for i in matches:
-        print(i[0], i[1])
+    for relation, doc_id in index.search(search_term.lower(), k=None):
+        print(relation, documents[doc_id][:100])
     
\ No newline at end of file
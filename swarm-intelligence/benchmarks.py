@@ -0,0 +1,185 @@
+'''Standard optimization test functions and a harness to measure the swarm optimizers on them'''
+
+import csv
+import json
+import math
+import argparse
+import numpy as np
+
+from time import perf_counter
+from particle_swarm import Solve, Swarm, error as rastrigin, rastrigin as rastrigin_batch
+from honeybee_swarm import Hive, ArrayHive, minimization_fitness, minimization_fitness_batch
+
+# ______________________________________________________________________________
+# scalar versions take a position (sequence of dim values) and vectorized ones an (n, dim) array of positions
+
+def sphere(position):
+    return sum(x * x for x in position)
+
+def sphere_batch(positions):
+    return (positions * positions).sum(axis=-1)
+
+def rosenbrock(position):
+    return sum(100 * (position[i + 1] - position[i] ** 2) ** 2 + (1 - position[i]) ** 2 for i in range(len(position) - 1))
+
+def rosenbrock_batch(positions):
+    return (100 * (positions[:, 1:] - positions[:, :-1] ** 2) ** 2 + (1 - positions[:, :-1]) ** 2).sum(axis=-1)
+
+def ackley(position):
+    dim = len(position)
+    squares = sum(x * x for x in position) / dim
+    cosines = sum(math.cos(2 * math.pi * x) for x in position) / dim
+    return -20 * math.exp(-0.2 * math.sqrt(squares)) - math.exp(cosines) + 20 + math.e
+
+def ackley_batch(positions):
+    squares = (positions * positions).mean(axis=-1)
+    cosines = np.cos(2 * np.pi * positions).mean(axis=-1)
+    return -20 * np.exp(-0.2 * np.sqrt(squares)) - np.exp(cosines) + 20 + np.e
+
+def griewank(position):
+    product = 1.0
+    for i, x in enumerate(position):
+        product *= math.cos(x / math.sqrt(i + 1))
+    return sum(x * x for x in position) / 4000 - product + 1
+
+def griewank_batch(positions):
+    i = np.arange(1, positions.shape[-1] + 1)
+    return (positions * positions).sum(axis=-1) / 4000 - np.cos(positions / np.sqrt(i)).prod(axis=-1) + 1
+
+class Function:
+    ''' A test function in both forms, with its usual search domain ([min_x, max_x] in every dimension)
+        and global minimum value '''
+    def __init__(self, name, scalar, vectorized, min_x, max_x, minimum=0.0):
+        self.name = name
+        self.scalar = scalar
+        self.vectorized = vectorized
+        self.min_x, self.max_x = min_x, max_x
+        self.minimum = minimum
+
+FUNCTIONS = {f.name: f for f in (
+    Function('sphere', sphere, sphere_batch, -5.12, 5.12),
+    Function('rastrigin', rastrigin, rastrigin_batch, -5.12, 5.12),
+    Function('rosenbrock', rosenbrock, rosenbrock_batch, -5.0, 10.0),
+    Function('ackley', ackley, ackley_batch, -32.768, 32.768),
+    Function('griewank', griewank, griewank_batch, -600.0, 600.0),
+)}
+
+# ______________________________________________________________________________
+class Tracker:
+    ''' Wraps an objective function, counting its evaluations and recording the best (lowest) value found so far:
+        its convergence curve (evaluations, seconds, best value) at every improvement, and when it first reached target '''
+    def __init__(self, func, batched=False, target=None):
+        self.func = func
+        self.batched = batched
+        self.target = target
+
+        self.evaluations = 0
+        self.best = float('inf')
+        self.curve = []
+        self.time_to_target = None
+        self.evaluations_to_target = None
+        self.start = perf_counter()
+
+    def __call__(self, x):
+        values = self.func(x)
+        best = float(np.min(values)) if self.batched else values
+        self.evaluations += len(values) if self.batched else 1
+        if best < self.best:
+            self.best = best
+            elapsed = perf_counter() - self.start
+            self.curve.append((self.evaluations, elapsed, best))
+            if self.time_to_target is None and self.target is not None and best <= self.target:
+                self.time_to_target = elapsed
+                self.evaluations_to_target = self.evaluations
+        return values
+
+def optimize(optimizer, function, dim, swarm_size, iterations, tracker, seed=0):
+    # runs the optimizer on the tracked function, returning nothing (all results are in the tracker)
+    if optimizer == 'pso':
+        Solve(iterations, swarm_size, dim, function.min_x, function.max_x, seed, objective=tracker, print_every=None)
+    elif optimizer == 'pso_vectorized':
+        Swarm(swarm_size, dim, function.min_x, function.max_x, tracker, seed).run(iterations, print_every=None)
+    elif optimizer == 'abc':
+        Hive([function.min_x] * dim, [function.max_x] * dim, tracker, swarm_size=swarm_size, max_cycles=iterations,
+             objective_value=function.minimum, print_cycle=None, seed=seed, fitness_func=minimization_fitness,
+             integer=False).solve()
+    elif optimizer == 'abc_vectorized':
+        ArrayHive([function.min_x] * dim, [function.max_x] * dim, tracker, swarm_size=swarm_size, max_cycles=iterations,
+                  objective_value=function.minimum, print_cycle=None, integer=False, seed=seed,
+                  fitness_func=minimization_fitness_batch).solve()
+    else:
+        raise ValueError(f"Unknown optimizer '{optimizer}', expected one of {OPTIMIZERS}")
+
+OPTIMIZERS = ('pso', 'pso_vectorized', 'abc', 'abc_vectorized')
+VECTORIZED = ('pso_vectorized', 'abc_vectorized')
+
+def run_benchmark(optimizer, function, dim, swarm_size, iterations, target=1e-4, seed=0):
+    '''
+    Runs the optimizer (with swarm_size particles or bees, for iterations epochs or cycles) on the function
+    and returns its results, where target is the error above the function's minimum that counts as solved
+    '''
+    if isinstance(function, str):
+        function = FUNCTIONS[function]
+    tracker = Tracker(function.vectorized if optimizer in VECTORIZED else function.scalar,
+                      batched=optimizer in VECTORIZED, target=function.minimum + target)
+    optimize(optimizer, function, dim, swarm_size, iterations, tracker, seed)
+    wall_time = perf_counter() - tracker.start
+    return {
+        'optimizer': optimizer, 'function': function.name, 'dim': dim, 'swarm_size': swarm_size,
+        'iterations': iterations, 'seed': seed, 'best_error': tracker.best - function.minimum,
+        'evaluations': tracker.evaluations, 'wall_time': wall_time,
+        'evaluations_per_second': tracker.evaluations / wall_time if wall_time > 0 else None,
+        'time_to_target': tracker.time_to_target, 'evaluations_to_target': tracker.evaluations_to_target,
+        'curve': tracker.curve,
+    }
+
+def harness(optimizers=OPTIMIZERS, functions=tuple(FUNCTIONS), dims=(2, 10, 30), swarm_sizes=(20, 100),
+            iterations=200, target=1e-4, seeds=(0,), verbose=True):
+    # runs every combination of the arguments, returning the list of run_benchmark results
+    results = []
+    for function in functions:
+        for dim in dims:
+            for swarm_size in swarm_sizes:
+                for optimizer in optimizers:
+                    for seed in seeds:
+                        result = run_benchmark(optimizer, function, dim, swarm_size, iterations, target, seed)
+                        results.append(result)
+                        if verbose:
+                            print(f"{function:>10} dim={dim:<4} size={swarm_size:<5} {optimizer:>14}: "
+                                  f"error = {result['best_error']:<12.6g} {result['evaluations_per_second']:>12,.0f} evals/s"
+                                  + (f", target in {result['time_to_target']:.3f}s" if result['time_to_target'] is not None else ""))
+    return results
+
+def save_results(fname, results):
+    # .json keeps the convergence curves, while .csv has one row per run, without them
+    if fname.endswith('.json'):
+        with open(fname, 'w') as f:
+            json.dump(results, f, indent=1)
+    else:
+        fields = [field for field in results[0] if field != 'curve']
+        with open(fname, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(results)
+
+def main():
+    args = get_parser().parse_args()
+    results = harness(args.optimizers, args.functions, args.dims, args.swarm_sizes, args.iterations, args.target, args.seeds)
+    if args.output:
+        save_results(args.output, results)
+        print(f"Results saved to {args.output}")
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Benchmarks the swarm optimizers on standard test functions")
+    parser.add_argument("--optimizers", nargs="+", choices=OPTIMIZERS, default=list(OPTIMIZERS), help="Optimizers to run")
+    parser.add_argument("--functions", nargs="+", choices=list(FUNCTIONS), default=list(FUNCTIONS), help="Test functions")
+    parser.add_argument("--dims", nargs="+", type=int, default=[2, 10], help="Dimensions")
+    parser.add_argument("--swarm_sizes", nargs="+", type=int, default=[20, 100], help="Numbers of particles / bees")
+    parser.add_argument("--iterations", type=int, default=200, help="Epochs (PSO) or cycles (ABC) of each run")
+    parser.add_argument("--target", type=float, default=1e-4, help="Error (above the minimum) that counts as reaching the target")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0], help="Random seeds (one run per seed)")
+    parser.add_argument("--output", "-o", help="Saves the results to this .json (with convergence curves) or .csv file")
+    return parser
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,85 @@
 # ref.: "A modified Artificial Bee Colony algorithm for real-parameter optimization" article
 
-from math import floor
-
 import copy
 import math
 import random
+import asyncio
 import numpy as np
 
+def minimization_fitness(value):
+    # the usual ABC fitness for minimizing an objective function (e.g. a cost), which is non-negative and higher is better
+    return 1 / (1 + value) if value >= 0 else 1 + abs(value)
+
+def minimization_fitness_batch(values):
+    # minimization_fitness of an array of values (for ArrayHive)
+    return np.where(values >= 0, 1 / (1 + np.abs(values)), 1 + np.abs(values))
+
 class Honeybee:
-    def __init__(self, lower_bound, upper_bound, objective_func):
+    def __init__(self, lower_bound, upper_bound, objective_func, rand=random, fitness_func=None, integer=True):
+        self.integer = integer # truncates the genes to integers
         self.solution = list() # genome
         for min, max in zip(lower_bound, upper_bound):
-            self.solution.append(int(min + random.random()*(max - min)))
+            gene = min + rand.random()*(max - min)
+            self.solution.append(int(gene) if integer else gene)
         
         self.objective_func = objective_func
+        self.fitness_func = fitness_func # maps the objective function value to the fitness (None uses the value itself)
+        self.value = None # cached objective function value (None until it's evaluated)
         self.unimproved_trials = 0 # once this reaches the limit it becomes a scout bee (abandonment criteria)
     
     def get_value(self):
         # objective function value (solution cost)
-        return self.objective_func(self.solution) # phenotype
+        if self.value is None:
+            self.value = self.objective_func(self.solution) # phenotype
+        return self.value
     
     def get_fitness(self):
-        # TODO test other fitness functions
-        return self.get_value()
+        value = self.get_value()
+        return self.fitness_func(value) if self.fitness_func is not None else value
     
-    def mutate(self, locus, partner, locus_lower_bound, locus_upper_bound):
+    def copy(self):
+        # cheaper than copy.deepcopy, as only the solution list is mutable
+        honeybee = copy.copy(self)
+        honeybee.solution = self.solution[:]
+        return honeybee
+    
+    def mutate(self, locus, partner, locus_lower_bound, locus_upper_bound, rand=random):
         # the locus is the solution's dimension that will be crossed-over and mutated (i.e. the mutated gene index)
-        mutated_gene = int(self.solution[locus] + random.uniform(-1, 1) * (self.solution[locus] - partner.solution[locus]))
+        mutated_gene = self.solution[locus] + rand.uniform(-1, 1) * (self.solution[locus] - partner.solution[locus])
+        if self.integer:
+            mutated_gene = int(mutated_gene)
         if mutated_gene < locus_lower_bound:
             self.solution[locus] = locus_lower_bound
         elif mutated_gene > locus_upper_bound:
             self.solution[locus] = locus_upper_bound
         else:
             self.solution[locus] = mutated_gene
+        self.value = None
 
 class Hive:
+    ''' Note: the candidate solutions of each phase are generated first and then evaluated together, concurrently if:
+            - executor is a concurrent.futures.Executor (e.g. a ProcessPoolExecutor, for expensive objective functions),
+              which is used to map objective_func over them
+            - objective_func is a coroutine function (async def), in which case they're awaited with asyncio.gather
+          as all of the random numbers are drawn from a random.Random(seed), results are deterministic for a given seed
+        Note: the onlookers' roulette wheel needs non-negative fitness values (higher is better), so objective functions
+              that should be minimized, or that can be negative, need a fitness_func (e.g. minimization_fitness)
+              while objective_value is compared with the objective function value itself
+        Note: solutions are truncated to integers unless integer is False '''
     def __init__(self, lower_bound, upper_bound, objective_func, 
                  swarm_size=20, max_cycles=200, max_unimproved_trials=None, 
-                 objective_value=0, print_cycle=100):
+                 objective_value=0, print_cycle=100, executor=None, seed=None, fitness_func=None, integer=True):
         assert(len(lower_bound) == len(upper_bound))
-        self.print_cycle = print_cycle
+        self.print_cycle = print_cycle # None disables printing
         self.objective_value = objective_value
 
         self.lower_bound = lower_bound
         self.upper_bound = upper_bound
         self.objective_func = objective_func
+        self.fitness_func = fitness_func
+        self.integer = integer
+        self.executor = executor
+        self.rand = random.Random(seed)
 
         self.swarm_size = swarm_size
 
@@ -56,17 +91,37 @@ class Hive:
         self.best = None # best solution found so far
         self.best_fitness = float('-inf') # best solution's fitness value (NOTE considers that higher is better)
 
-        self.swarm = [Honeybee(self.lower_bound, self.upper_bound, self.objective_func) for _ in range(self.swarm_size)]
+        self.swarm = [self.new_honeybee() for _ in range(self.swarm_size)]
+        self.calculate_values(self.swarm)
         self.evaluate() # find the best (most fit) honeybee
     
+    def new_honeybee(self):
+        return Honeybee(self.lower_bound, self.upper_bound, self.objective_func, self.rand, self.fitness_func, self.integer)
+    
+    def calculate_values(self, honeybees):
+        # evaluates the objective function of every honeybee (that isn't cached yet) at once
+        honeybees = [honeybee for honeybee in honeybees if honeybee.value is None]
+        solutions = [honeybee.solution for honeybee in honeybees]
+        if asyncio.iscoroutinefunction(self.objective_func):
+            async def gather():
+                return await asyncio.gather(*(self.objective_func(solution) for solution in solutions))
+            values = asyncio.run(gather())
+        elif self.executor is not None:
+            values = self.executor.map(self.objective_func, solutions)
+        else:
+            values = map(self.objective_func, solutions)
+        for honeybee, value in zip(honeybees, values):
+            honeybee.value = value
+    
     def solve(self):
         self.cycle = 1
         while self.cycle <= self.max_cycles:
-            if self.best_fitness == self.objective_value:
-                print(f"@cycle {self.cycle:>4}: best = {''.join(map(chr, self.best.solution))}")
+            if self.best.get_value() == self.objective_value:
+                if self.print_cycle:
+                    print(f"@cycle {self.cycle:>4}: best = {''.join(map(chr, self.best.solution))}")
                 break
 
-            if self.cycle % self.print_cycle == 0:
+            if self.print_cycle and self.cycle % self.print_cycle == 0:
                 print(f"@cycle {self.cycle:>4}: best = {''.join(map(chr, self.best.solution))}")
 
             self.send_employees()
@@ -85,49 +140,205 @@ class Hive:
         for i in range(self.swarm_size):
             fitness = self.swarm[i].get_fitness()
             if fitness > self.best_fitness:
-                self.best = copy.deepcopy(self.swarm[i])
+                self.best = self.swarm[i].copy()
                 self.best_fitness = fitness
 
     def calculate_probabilities(self):
         # calculates the probability of selection of each honeybee based on roulette wheel selection
         fitness = [honeybee.get_fitness() for honeybee in self.swarm]
+        if min(fitness) < 0:
+            raise ValueError("Negative fitness values break the roulette wheel selection, use a non-negative fitness_func")
         fitness_sum = sum(fitness)
         self.selection_probability = [fitness[i] / fitness_sum if fitness_sum != 0 else 1.0 for i in range(self.swarm_size)]
     
-    def exploit(self, honeybee_index):
-        neighboor = copy.deepcopy(self.swarm[honeybee_index])
+    def neighboor(self, honeybee_index):
+        neighboor = self.swarm[honeybee_index].copy()
         
-        locus = random.randint(0, self.dim-1)
-        potential_partners_index = [i for i in range(self.swarm_size) if i != honeybee_index]
+        locus = self.rand.randint(0, self.dim-1)
+        partner_index = self.rand.randrange(self.swarm_size - 1)
+        partner_index += partner_index >= honeybee_index # any honeybee but itself
         neighboor.mutate(locus=locus, 
-                         partner=self.swarm[random.choice(potential_partners_index)], 
+                         partner=self.swarm[partner_index], 
                          locus_lower_bound=self.lower_bound[locus], 
-                         locus_upper_bound=self.upper_bound[locus])
+                         locus_upper_bound=self.upper_bound[locus],
+                         rand=self.rand)
+        return neighboor
+    
+    def exploit(self, honeybee_indices):
+        neighboors = [self.neighboor(honeybee_index) for honeybee_index in honeybee_indices]
+        self.calculate_values(neighboors)
         
-        fitness = neighboor.get_fitness()
-        if fitness > self.swarm[honeybee_index].get_fitness(): # NOTE considers that the higher the fitness the better
-            self.swarm[honeybee_index] = copy.deepcopy(neighboor)
-            self.swarm[honeybee_index].unimproved_trials = 0
-        else:
-            self.swarm[honeybee_index].unimproved_trials += 1
+        for honeybee_index, neighboor in zip(honeybee_indices, neighboors):
+            if neighboor.get_fitness() > self.swarm[honeybee_index].get_fitness(): # NOTE considers that the higher the fitness the better
+                neighboor.unimproved_trials = 0
+                self.swarm[honeybee_index] = neighboor
+            else:
+                self.swarm[honeybee_index].unimproved_trials += 1
 
     def send_employees(self):
-        for honeybee_index in range(self.swarm_size):
-            self.exploit(honeybee_index)
+        self.exploit(range(self.swarm_size))
     
     def send_onlookers(self):
+        honeybee_indices = []
         honeybee_index = 0
-        number_of_onlookers = 0
-        while number_of_onlookers < self.swarm_size:
-            if random.random() < self.selection_probability[honeybee_index]:
-                number_of_onlookers += 1
-                self.exploit(honeybee_index)
+        while len(honeybee_indices) < self.swarm_size:
+            if self.rand.random() < self.selection_probability[honeybee_index]:
+                honeybee_indices.append(honeybee_index)
             honeybee_index = (honeybee_index + 1) % self.swarm_size
+        self.exploit(honeybee_indices)
 
     def send_scouts(self):
         for honeybee_index in range(self.swarm_size):
             if self.swarm[honeybee_index].unimproved_trials >= self.max_unimproved_trials:
-                self.swarm[honeybee_index] = Honeybee(self.lower_bound, self.upper_bound, self.objective_func)
+                self.swarm[honeybee_index] = self.new_honeybee()
+        self.calculate_values(self.swarm)
+
+# ______________________________________________________________________________
+ONLOOKER_BLOCK_SIZE = 1 << 20 # maximum number of random numbers ArrayHive draws at once to pick the onlookers
+
+class ArrayHive:
+    ''' Same algorithm as Hive, but the swarm is kept in arrays (solutions, their cached fitness and unimproved trials),
+        so that each phase mutates every bee at once and evaluates all of the candidates with a single objective call
+        Note: objective_func takes an (n, dim) array of solutions and returns the n values (e.g. poppins_batch)
+        Note: unlike Hive, where bees exploit their food sources one after the other, every bee in a phase sees the
+              solutions from its start, and an onlooker bee chosen k times tries k neighbours and keeps the best one
+        Note: solutions are truncated to integers (as Hive's are by default) unless integer is False
+        Note: as in Hive, fitness_func must turn the values into non-negative fitness values (e.g. minimization_fitness_batch)
+              when they can be negative, or should be minimized
+    '''
+    def __init__(self, lower_bound, upper_bound, objective_func, 
+                 swarm_size=20, max_cycles=200, max_unimproved_trials=None, 
+                 objective_value=0, print_cycle=100, integer=True, seed=None, format_solution=None, fitness_func=None):
+        assert(len(lower_bound) == len(upper_bound))
+        assert(swarm_size >= 2) # bees need a partner to mutate with
+        self.print_cycle = print_cycle # None disables printing
+        self.objective_value = objective_value
+        self.format_solution = format_solution if format_solution is not None else lambda solution: str(solution.tolist())
+
+        self.lower_bound = np.asarray(lower_bound, dtype=np.float64)
+        self.upper_bound = np.asarray(upper_bound, dtype=np.float64)
+        self.objective_func = objective_func
+        self.fitness_func = fitness_func # maps an array of objective function values to their fitness (None uses the values)
+        self.integer = integer
+        self.rng = np.random.default_rng(seed)
+
+        self.swarm_size = swarm_size
+
+        self.dim = len(lower_bound) # problem dimension
+        self.cycle = 0
+        self.max_cycles = max_cycles
+        self.max_unimproved_trials = max_unimproved_trials if max_unimproved_trials != None else 0.5 * self.swarm_size * self.dim
+        self.evaluations = 0 # number of solutions evaluated
+
+        self.best = None # best solution found so far
+        self.best_value = None # best solution's objective function value
+        self.best_fitness = float('-inf') # best solution's fitness value (NOTE considers that higher is better)
+
+        self.solutions = self.random_solutions(self.swarm_size)
+        self.values = self.get_values(self.solutions)
+        self.fitness = self.get_fitness(self.values)
+        self.unimproved_trials = np.zeros(self.swarm_size, dtype=np.int64)
+        self.evaluate() # find the best (most fit) honeybee
+
+    def random_solutions(self, n):
+        solutions = self.lower_bound + self.rng.random((n, self.dim)) * (self.upper_bound - self.lower_bound)
+        return np.trunc(solutions) if self.integer else solutions
+
+    def get_values(self, solutions):
+        self.evaluations += len(solutions)
+        return np.asarray(self.objective_func(solutions), dtype=np.float64)
+
+    def get_fitness(self, values):
+        return np.asarray(self.fitness_func(values), dtype=np.float64) if self.fitness_func is not None else values
+
+    def solve(self):
+        self.cycle = 1
+        while self.cycle <= self.max_cycles:
+            if self.best_value == self.objective_value:
+                if self.print_cycle:
+                    print(f"@cycle {self.cycle:>4}: best = {self.format_solution(self.best)}")
+                break
+
+            if self.print_cycle and self.cycle % self.print_cycle == 0:
+                print(f"@cycle {self.cycle:>4}: best = {self.format_solution(self.best)}")
+
+            self.send_employees()
+            self.send_onlookers()
+            self.send_scouts()
+
+            self.evaluate() # memorize the best solution achieved so far
+            self.cycle += 1
+
+        return self.best
+
+    def evaluate(self):
+        i = int(self.fitness.argmax())
+        if self.fitness[i] > self.best_fitness:
+            self.best = self.solutions[i].copy()
+            self.best_value = float(self.values[i])
+            self.best_fitness = float(self.fitness[i])
+
+    def calculate_probabilities(self):
+        # calculates the probability of selection of each honeybee based on roulette wheel selection
+        if self.fitness.min() < 0:
+            raise ValueError("Negative fitness values break the roulette wheel selection, use a non-negative fitness_func")
+        fitness_sum = self.fitness.sum()
+        return self.fitness / fitness_sum if fitness_sum != 0 else np.ones(self.swarm_size)
+
+    def neighbours(self, indices):
+        # mutates a random locus of each of the indexed solutions, crossing it with a random partner's
+        m = len(indices)
+        loci = self.rng.integers(0, self.dim, m)
+        partners = self.rng.integers(0, self.swarm_size - 1, m)
+        partners += partners >= indices # skips the bee itself
+        genes = self.solutions[indices, loci]
+        mutated = genes + self.rng.uniform(-1, 1, m) * (genes - self.solutions[partners, loci])
+        if self.integer:
+            mutated = np.trunc(mutated)
+        neighbours = self.solutions[indices]
+        neighbours[np.arange(m), loci] = np.clip(mutated, self.lower_bound[loci], self.upper_bound[loci])
+        return neighbours
+
+    def exploit(self, indices):
+        neighbours = self.neighbours(indices)
+        values = self.get_values(neighbours)
+        fitness = self.get_fitness(values)
+
+        # the best neighbour of each bee (as onlookers may pick the same bee more than once)
+        order = np.lexsort((-fitness, indices))
+        bees, first, tries = np.unique(indices[order], return_index=True, return_counts=True)
+        best = order[first]
+
+        improved = fitness[best] > self.fitness[bees] # NOTE considers that the higher the fitness the better
+        self.unimproved_trials[bees] += tries
+        bees, best = bees[improved], best[improved]
+        self.solutions[bees] = neighbours[best]
+        self.values[bees] = values[best]
+        self.fitness[bees] = fitness[best]
+        self.unimproved_trials[bees] = 0
+
+    def send_employees(self):
+        self.exploit(np.arange(self.swarm_size))
+
+    def send_onlookers(self):
+        # same as Hive's, i.e. cycles through the bees, picking each with its probability, until swarm_size are picked
+        probabilities = self.calculate_probabilities()
+        expected_passes = self.swarm_size / max(probabilities.sum(), 1e-12) # as each pass picks sum(probabilities) bees on average
+        passes = min(int(1.2 * expected_passes) + 1, max(1, ONLOOKER_BLOCK_SIZE // self.swarm_size)) # bounds the memory used
+        picked, number_of_onlookers = [], 0
+        while number_of_onlookers < self.swarm_size:
+            # draws several passes at once, reading them in order (i.e. row by row)
+            picked.append(np.flatnonzero(self.rng.random((passes, self.swarm_size)) < probabilities) % self.swarm_size)
+            number_of_onlookers += len(picked[-1])
+        self.exploit(np.concatenate(picked)[:self.swarm_size])
+
+    def send_scouts(self):
+        scouts = np.flatnonzero(self.unimproved_trials >= self.max_unimproved_trials)
+        if len(scouts) != 0:
+            self.solutions[scouts] = self.random_solutions(len(scouts))
+            self.values[scouts] = self.get_values(self.solutions[scouts])
+            self.fitness[scouts] = self.get_fitness(self.values[scouts])
+            self.unimproved_trials[scouts] = 0
 
 # ______________________________________________________________________________
 
@@ -139,16 +350,22 @@ def poppins(vector):
             score += 1
     return score
 
-dim = len(target)
-swarm_size = 100
-max_cycles = 5000
-model = Hive(lower_bound=[ord('a')]*dim, 
-             upper_bound=[ord('z')]*dim, 
-             objective_func=poppins, 
-             swarm_size=swarm_size, 
-             max_cycles=max_cycles, 
-             objective_value=dim)
-
-solution = model.solve()
-print(f"value    : {solution.get_value()}")
-print(f"solution : {list(map(chr, solution.solution))}")
+encoded_target = np.array([ord(target_char) for target_char in target])
+def poppins_batch(solutions):
+    # poppins' score of each row of solutions (for ArrayHive)
+    return (solutions == encoded_target).sum(axis=1)
+
+if __name__ == "__main__":
+    dim = len(target)
+    swarm_size = 100
+    max_cycles = 5000
+    model = Hive(lower_bound=[ord('a')]*dim, 
+                 upper_bound=[ord('z')]*dim, 
+                 objective_func=poppins, 
+                 swarm_size=swarm_size, 
+                 max_cycles=max_cycles, 
+                 objective_value=dim)
+
+    solution = model.solve()
+    print(f"value    : {solution.get_value()}")
+    print(f"solution : {list(map(chr, solution.solution))}")
@@ -0,0 +1,146 @@
+'''Multi-start and cooperative multi-swarm PSO over a pool of processes, with early stopping'''
+
+import json
+import argparse
+import numpy as np
+
+from time import time
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from particle_swarm import Swarm, rastrigin
+
+MODES = ('independent', 'cooperative')
+
+class Run:
+    ''' A Swarm and its stopping criteria, which halts once its best error is at most target_error, or once it
+        hasn't improved by more than tol for patience epochs in a row (or after max_epochs epochs) '''
+    def __init__(self, index, seed, n, dim, min_x, max_x, objective=rastrigin,
+                 max_epochs=1000, target_error=None, patience=None, tol=1e-8):
+        self.index = index
+        self.seed = seed
+        self.swarm = Swarm(n, dim, min_x, max_x, objective, seed=np.random.default_rng(seed))
+        self.max_epochs = max_epochs
+        self.target_error = target_error
+        self.patience = patience
+        self.tol = tol
+
+        self.stagnant_epochs = 0
+        self.last_best_err = self.swarm.swarm_best_err
+        self.wall_time = 0.0
+        self.stop_reason = None # 'target', 'stagnation', 'max_epochs' (or 'other_swarm') once it has stopped
+
+    def is_finished(self):
+        return self.stop_reason is not None
+
+    def check(self):
+        if self.last_best_err - self.swarm.swarm_best_err > self.tol:
+            self.stagnant_epochs = 0
+        else:
+            self.stagnant_epochs += 1
+        self.last_best_err = min(self.last_best_err, self.swarm.swarm_best_err)
+
+        if self.target_error is not None and self.swarm.swarm_best_err <= self.target_error:
+            self.stop_reason = 'target'
+        elif self.patience is not None and self.stagnant_epochs >= self.patience:
+            self.stop_reason = 'stagnation'
+        elif self.swarm.epoch >= self.max_epochs:
+            self.stop_reason = 'max_epochs'
+
+    def share(self, best_err, best_pos):
+        # attracts the swarm to another swarm's best, if it's better than its own
+        if best_err < self.swarm.swarm_best_err:
+            self.swarm.swarm_best_err = best_err
+            self.swarm.swarm_best_pos = best_pos.copy()
+
+    def stats(self):
+        return {
+            'run': self.index, 'seed': self.seed, 'best_error': self.swarm.swarm_best_err,
+            'best_position': self.swarm.swarm_best_pos.tolist(), 'epochs': self.swarm.epoch,
+            'evaluations': self.swarm.evaluations, 'wall_time': self.wall_time, 'stop_reason': self.stop_reason,
+        }
+
+def advance(run, epochs=None):
+    # steps the run's swarm for (at most) epochs epochs, or until it stops
+    start = time()
+    if run.target_error is not None and run.swarm.swarm_best_err <= run.target_error:
+        run.stop_reason = 'target' # e.g. after receiving another swarm's best
+    for _ in range(epochs if epochs is not None else run.max_epochs):
+        if run.is_finished():
+            break
+        run.swarm.step()
+        run.check()
+    run.wall_time += time() - start
+    return run
+
+def solve(run):
+    # runs an independent swarm until it stops, returning only its stats (as the swarm itself can be big)
+    return advance(run).stats()
+
+# ______________________________________________________________________________
+def multi_start(n_runs, n, dim, min_x, max_x, objective=rastrigin, mode='independent', max_epochs=1000,
+                target_error=None, patience=None, tol=1e-8, exchange_interval=10, seed=None, processes=None):
+    '''
+    Runs n_runs swarms of n particles in a pool of processes (defaults to one per CPU), each with its own seed, either:
+        'independent' : each swarm runs on its own until it stops (see Run), i.e. random restarts
+        'cooperative' : every exchange_interval epochs the swarms' global best is shared with all of them,
+                        until one of them reaches target_error or all of them stop
+    Note: objective must be defined at a module's top level, so that it can be sent to the processes
+    Returns the stats of each run (best error and position, epochs, evaluations, wall time and why it stopped)
+    '''
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(n_runs)]
+    runs = [Run(i, seeds[i], n, dim, min_x, max_x, objective, max_epochs, target_error, patience, tol) for i in range(n_runs)]
+
+    with ProcessPoolExecutor(processes) as executor:
+        if mode == 'independent':
+            return list(executor.map(solve, runs))
+
+        while not any(run.stop_reason == 'target' for run in runs) and not all(run.is_finished() for run in runs):
+            runs = list(executor.map(advance, runs, repeat(exchange_interval)))
+            best = min(runs, key=lambda run: run.swarm.swarm_best_err)
+            for run in runs:
+                if not run.is_finished():
+                    run.share(best.swarm.swarm_best_err, best.swarm.swarm_best_pos)
+        for run in runs:
+            if not run.is_finished():
+                run.stop_reason = 'other_swarm' # another swarm reached the target
+        return [run.stats() for run in runs]
+
+def main():
+    args = get_parser().parse_args()
+    start = time()
+    results = multi_start(args.runs, args.particles, args.dim, args.min_x, args.max_x, rastrigin, args.mode,
+                          args.max_epochs, args.target_error, args.patience, args.tol, args.exchange_interval,
+                          args.seed, args.processes)
+    elapsed = time() - start
+
+    for result in results:
+        print(f"run {result['run']:>3}: best error = {result['best_error']:.6f} after {result['epochs']:>5} epochs "
+              f"({result['wall_time']:.2f}s, stopped by {result['stop_reason']})")
+    best = min(results, key=lambda result: result['best_error'])
+    print(f"\nBest error = {best['best_error']:.6f} (run {best['run']}), total wall time = {elapsed:.2f}s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'wall_time': elapsed, 'runs': results}, f, indent=2)
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Minimizes the Rastrigin function with many PSO swarms in parallel")
+    parser.add_argument("--runs", "-k", type=int, default=8, help="Number of swarms")
+    parser.add_argument("--mode", choices=MODES, default="independent", help="Independent restarts or cooperating swarms")
+    parser.add_argument("--particles", "-n", type=int, default=50, help="Number of particles in each swarm")
+    parser.add_argument("--dim", type=int, default=10, help="Rastrigin function's dimension")
+    parser.add_argument("--min_x", type=float, default=-10.0, help="Minimum x_i value")
+    parser.add_argument("--max_x", type=float, default=10.0, help="Maximum x_i value")
+    parser.add_argument("--max_epochs", type=int, default=1000, help="Epochs limit of each swarm")
+    parser.add_argument("--target_error", type=float, default=None, help="Stops once a swarm's best error is at most this")
+    parser.add_argument("--patience", type=int, default=None, help="Stops a swarm after this many epochs without improvement")
+    parser.add_argument("--tol", type=float, default=1e-8, help="Minimum decrease in error that counts as an improvement")
+    parser.add_argument("--exchange_interval", type=int, default=10, help="Epochs between sharing the best (cooperative mode)")
+    parser.add_argument("--processes", "-j", type=int, default=None, help="Number of processes (defaults to the CPU count)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (for reproducible results)")
+    parser.add_argument("--output", "-o", help="Saves the per run stats to this .json file")
+    return parser
+
+if __name__ == "__main__":
+    main()
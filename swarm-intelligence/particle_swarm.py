@@ -5,6 +5,7 @@
 
 import random
 import math
+import numpy as np
 from copy import copy
 
 def error(position):
@@ -14,8 +15,12 @@ def error(position):
         err += (xi * xi) - (10 * math.cos(2 * math.pi * xi)) + 10
     return err
 
+def rastrigin(positions):
+    # vectorized error(), i.e. the Rastrigin function's value at each row of the (n, dim) positions
+    return (positions * positions - 10 * np.cos(2 * np.pi * positions) + 10).sum(axis=-1)
+
 class Particle:
-    def __init__(self, dim, min_x, max_x, seed):
+    def __init__(self, dim, min_x, max_x, seed, objective=error):
         '''Parameters
             dim : int
                 Rastrigin function's dimension (i.e. the number of x_i variables, i ∈ [1, dim])
@@ -25,6 +30,8 @@ class Particle:
                 Maximum x_i value (x_i ∈ [min_x, max_x])
             seed : int
                 Random seed
+            objective : callable
+                Function to minimize, taking a position (list of dim values) and returning its error (defaults to error)
         '''
         rand = random.Random(seed)
         self.position = [0.0] * dim
@@ -33,12 +40,12 @@ class Particle:
             self.position[i] = ((max_x - min_x) * rand.random() + min_x)
             self.velocity[i] = ((max_x - min_x) * rand.random() + min_x)
 
-        self.error = error(self.position) # current error
+        self.error = objective(self.position) # current error
         
         self.best_pos = copy(self.position) # particle's best reached position
         self.best_err = self.error          # particle's best reached error
 
-def Solve(max_epochs, n, dim, min_x, max_x, seed=0):
+def Solve(max_epochs, n, dim, min_x, max_x, seed=0, objective=error, print_every=10):
     '''Parameters
         max_epochs : int
             Epochs limit (halts when reached)
@@ -52,10 +59,14 @@ def Solve(max_epochs, n, dim, min_x, max_x, seed=0):
             Maximum x_i value (x_i ∈ [min_x, max_x])
         seed : int
             Random seed
+        objective : callable
+            Function to minimize, taking a position (list of dim values) and returning its error (defaults to error)
+        print_every : int
+            Epochs between progress prints (None disables them)
     '''
     rand = random.Random(seed) # TODO change this seed for different results
 
-    swarm = [Particle(dim, min_x, max_x, seed = i) for i in range(n)] # creates n random particles
+    swarm = [Particle(dim, min_x, max_x, seed = i, objective = objective) for i in range(n)] # creates n random particles
 
     swarm_best_pos = [0.0] * dim
     swarm_best_err = float('inf')
@@ -71,7 +82,7 @@ def Solve(max_epochs, n, dim, min_x, max_x, seed=0):
 
     epoch = 0
     while epoch < max_epochs:    
-        if epoch % 10 == 0 and epoch > 1:
+        if print_every and epoch % print_every == 0 and epoch > 1:
             print(f'Epoch = {epoch}, best error = {swarm_best_err:.3f}')
             
         # process each particle
@@ -93,7 +104,7 @@ def Solve(max_epochs, n, dim, min_x, max_x, seed=0):
                 swarm[i].position[k] += swarm[i].velocity[k]
     
             # compute the error of the new position
-            swarm[i].error = error(swarm[i].position)
+            swarm[i].error = objective(swarm[i].position)
 
             # is the new position a new best for the particle?
             if swarm[i].error < swarm[i].best_err:
@@ -109,18 +120,90 @@ def Solve(max_epochs, n, dim, min_x, max_x, seed=0):
 
     return swarm_best_pos
 
-dim = 3
-print(f'Solving Rastrigin\'s function in {dim} variables (known min = 0.0 at ({(dim - 1) * "0, "}0))')
+class Swarm:
+    ''' Vectorized version of Solve's swarm, with the particles' positions, velocities and best positions stored
+        as (n, dim) arrays, so that each epoch is a handful of array operations and a single call to the objective
+        function, which takes an (n, dim) array and returns the n errors (e.g. rastrigin)
+        Note: unlike Solve, where a particle can already be attracted by a swarm best found earlier in the same epoch,
+              the swarm's best is only updated at the end of each epoch (i.e. a synchronous PSO)
+        Note: dtype must be np.float64 or np.float32 (which halves the memory and is faster for huge swarms) '''
+    def __init__(self, n, dim, min_x, max_x, objective=rastrigin, seed=None,
+                 w=0.729, c1=1.49445, c2=1.49445, dtype=np.float64):
+        self.min_x, self.max_x = min_x, max_x
+        self.objective = objective
+        self.w, self.c1, self.c2 = w, c1, c2 # inertia, cognitive (particle) and social (swarm) weights
+        self.rng = np.random.default_rng(seed)
+
+        self.position = ((max_x - min_x) * self.rng.random((n, dim)) + min_x).astype(dtype)
+        self.velocity = ((max_x - min_x) * self.rng.random((n, dim)) + min_x).astype(dtype)
+        self.error = np.asarray(objective(self.position)) # current errors
+
+        self.best_pos = self.position.copy() # each particle's best reached position
+        self.best_err = self.error.copy()    # each particle's best reached error
+
+        best = int(self.best_err.argmin())
+        self.swarm_best_pos = self.best_pos[best].copy()
+        self.swarm_best_err = float(self.best_err[best])
+
+        self.epoch = 0
+        self.evaluations = n # number of objective function evaluations (i.e. of particle positions)
+        self.random = np.empty((n, dim), dtype=dtype) # buffers reused every epoch
+        self.delta = np.empty((n, dim), dtype=dtype)
+
+    def step(self):
+        # velocity = w * velocity + c1 * r1 * (best_pos - position) + c2 * r2 * (swarm_best_pos - position)
+        self.velocity *= self.w
+        for weight, target in ((self.c1, self.best_pos), (self.c2, self.swarm_best_pos)):
+            np.subtract(target, self.position, out=self.delta)
+            self.rng.random(out=self.random, dtype=self.random.dtype)
+            self.delta *= self.random
+            self.delta *= weight
+            self.velocity += self.delta
+        np.clip(self.velocity, self.min_x, self.max_x, out=self.velocity)
+        self.position += self.velocity
+
+        self.error = np.asarray(self.objective(self.position))
+        self.evaluations += len(self.error)
+
+        improved = self.error < self.best_err
+        self.best_pos[improved] = self.position[improved]
+        self.best_err[improved] = self.error[improved]
+
+        best = int(self.best_err.argmin())
+        if self.best_err[best] < self.swarm_best_err:
+            self.swarm_best_err = float(self.best_err[best])
+            self.swarm_best_pos = self.best_pos[best].copy()
+        self.epoch += 1
+
+    def run(self, max_epochs, print_every=10):
+        while self.epoch < max_epochs:
+            if print_every and self.epoch % print_every == 0 and self.epoch > 1:
+                print(f'Epoch = {self.epoch}, best error = {self.swarm_best_err:.3f}')
+            self.step()
+        return self.swarm_best_pos
+
+def SolveVectorized(max_epochs, n, dim, min_x, max_x, seed=0, objective=rastrigin, print_every=10):
+    '''Same parameters as Solve, plus:
+        objective : callable
+            Vectorized objective function, taking an (n, dim) array of positions (defaults to rastrigin)
+        print_every : int
+            Epochs between progress prints (None disables them)
+    '''
+    return Swarm(n, dim, min_x, max_x, objective, seed).run(max_epochs, print_every)
+
+if __name__ == "__main__":
+    dim = 3
+    print(f'Solving Rastrigin\'s function in {dim} variables (known min = 0.0 at ({(dim - 1) * "0, "}0))')
 
-# TODO play with the following values for different results
-num_particles = 50
-max_epochs    = 100
-min_x, max_x  = -10.0, 10.0
-print(f'Setting num_particles  = {num_particles}')
-print(f'        max_epochs     = {max_epochs}')
-print(f'       [min_x, max_x]  = [{min_x}, {max_x}]\n')
+    # TODO play with the following values for different results
+    num_particles = 50
+    max_epochs    = 100
+    min_x, max_x  = -10.0, 10.0
+    print(f'Setting num_particles  = {num_particles}')
+    print(f'        max_epochs     = {max_epochs}')
+    print(f'       [min_x, max_x]  = [{min_x}, {max_x}]\n')
 
-best_position = Solve(max_epochs, num_particles, dim, min_x, max_x, seed=random.random())
+    best_position = Solve(max_epochs, num_particles, dim, min_x, max_x, seed=random.random())
 
-print(f'\nBest solution found: \n {" ".join(map(lambda i: f"{i:.4f}", best_position))}')
-print(f'Error of best solution = {error(best_position):.6f}')
\ No newline at end of file
+    print(f'\nBest solution found: \n {" ".join(map(lambda i: f"{i:.4f}", best_position))}')
+    print(f'Error of best solution = {error(best_position):.6f}')